@@ -17,7 +17,13 @@ class SnapshotRegistry:
     for persistent storage.
     """
 
-    def __init__(self, redis_host: str = 'localhost', redis_port: int = 6379, s3_stub_path: str = 'local/snapshots'):
+    def __init__(
+        self,
+        redis_host: str = 'localhost',
+        redis_port: int = 6379,
+        s3_stub_path: str = 'local/snapshots',
+        connection_pool: Optional[redis.ConnectionPool] = None,
+    ):
         """
         Initializes the SnapshotRegistry.
 
@@ -25,8 +31,15 @@ class SnapshotRegistry:
             redis_host: Hostname for the Redis server.
             redis_port: Port number for the Redis server.
             s3_stub_path: Path to the local directory serving as an S3 stub.
+            connection_pool: Optional shared redis.ConnectionPool (created with
+                             decode_responses=True). When given, redis_host and
+                             redis_port are ignored.
         """
-        self.redis_client = redis.Redis(host=redis_host, port=redis_port, db=0, decode_responses=True)
+        if connection_pool is not None:
+            # Переиспользуем общий пул соединений вместо нового подключения
+            self.redis_client = redis.Redis(connection_pool=connection_pool)
+        else:
+            self.redis_client = redis.Redis(host=redis_host, port=redis_port, db=0, decode_responses=True)
         self.s3_stub_path = Path(s3_stub_path)
         self.s3_stub_path.mkdir(parents=True, exist_ok=True)
         self._snapshot_key_prefix = "snapshot:"
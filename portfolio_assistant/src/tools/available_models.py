@@ -0,0 +1,55 @@
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Директория с моделями CatBoost и имена файлов моделей: catboost_<TICKER>.cbm
+MODELS_DIR = Path(__file__).absolute().parent.parent.parent.parent / "models"
+MODEL_PREFIX = "catboost_"
+MODEL_SUFFIX = ".cbm"
+
+# --- Инициализация --- #
+# Кеш по директориям: путь -> (st_mtime_ns директории, множество тикеров)
+_available_cache: Dict[Path, Tuple[int, FrozenSet[str]]] = {}
+
+
+def get_available_tickers(models_dir: Optional[Path] = None) -> FrozenSet[str]:
+    """
+    Возвращает множество тикеров, для которых есть модель CatBoost.
+
+    Директория пересканируется только при изменении ее st_mtime_ns, поэтому
+    повторные вызовы из инструментов обходятся одним stat(). Результат -
+    неизменяемый frozenset, его можно отдавать вызывающим без копирования.
+    """
+    models_dir = MODELS_DIR if models_dir is None else Path(models_dir)
+    try:
+        mtime_ns = models_dir.stat().st_mtime_ns
+    except OSError:
+        logger.warning(f"Директория с моделями не найдена: {models_dir}")
+        return frozenset()
+
+    cached = _available_cache.get(models_dir)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    # os.scandir без fnmatch и создания Path для каждого файла
+    tickers = []
+    with os.scandir(models_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith(MODEL_PREFIX) and name.endswith(MODEL_SUFFIX):
+                ticker = sys.intern(name[len(MODEL_PREFIX):-len(MODEL_SUFFIX)])
+                if ticker:
+                    tickers.append(ticker)
+
+    available = frozenset(tickers)
+    _available_cache[models_dir] = (mtime_ns, available)
+    return available
+
+
+def clear_ticker_cache() -> None:
+    """Сбрасывает кеш get_available_tickers для всех директорий (например, после обучения новых моделей)."""
+    _available_cache.clear()
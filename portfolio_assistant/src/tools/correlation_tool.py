@@ -4,24 +4,13 @@ import pandas as pd
 import yfinance as yf
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 import tempfile
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-logger = logging.getLogger(__name__)
+from . import available_models
 
-def get_available_tickers() -> List[str]:
-    """Получает список доступных тикеров на основе наличия моделей CatBoost."""
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    available_tickers = []
-    
-    for model_file in models_path.glob("catboost_*.cbm"):
-        ticker = model_file.stem.replace("catboost_", "")
-        if ticker:
-            available_tickers.append(ticker)
-    
-    return available_tickers
+logger = logging.getLogger(__name__)
 
 def correlation_tool(
     tickers: List[str] = None,
@@ -46,17 +35,17 @@ def correlation_tool(
     logger.info(f"Calculating correlations for tickers: {tickers}")
     
     # Проверяем доступность тикеров
-    available_tickers = get_available_tickers()
+    available_set = available_models.get_available_tickers()
     
     if not tickers or len(tickers) < 2:
         return {
             "error": "Для анализа корреляций требуется минимум 2 тикера",
-            "available_tickers": available_tickers[:10]
+            "available_tickers": sorted(available_set)[:10]
         }
     
     # Фильтруем доступные тикеры
-    valid_tickers = [t for t in tickers if t in available_tickers]
-    invalid_tickers = [t for t in tickers if t not in available_tickers]
+    valid_tickers = [t for t in tickers if t in available_set]
+    invalid_tickers = [t for t in tickers if t not in available_set]
     
     if invalid_tickers:
         logger.warning(f"Недоступные тикеры: {invalid_tickers}")
@@ -64,7 +53,7 @@ def correlation_tool(
     if len(valid_tickers) < 2:
         return {
             "error": f"Доступно только {len(valid_tickers)} тикера из {len(tickers)}, нужно минимум 2",
-            "available_tickers": available_tickers[:10],
+            "available_tickers": sorted(available_set)[:10],
             "invalid_tickers": invalid_tickers
         }
     
@@ -2,25 +2,14 @@ import logging
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Any, Optional, Tuple
-from pathlib import Path
 import tempfile
 import matplotlib.pyplot as plt
 from pypfopt import EfficientFrontier, risk_models, expected_returns
 from pypfopt.plotting import plot_efficient_frontier
 
-logger = logging.getLogger(__name__)
+from . import available_models
 
-def get_available_tickers() -> List[str]:
-    """Получает список доступных тикеров на основе наличия моделей CatBoost."""
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    available_tickers = []
-    
-    for model_file in models_path.glob("catboost_*.cbm"):
-        ticker = model_file.stem.replace("catboost_", "")
-        if ticker:
-            available_tickers.append(ticker)
-    
-    return available_tickers
+logger = logging.getLogger(__name__)
 
 def efficient_frontier_tool(
     tickers: List[str] = None,
@@ -71,17 +60,17 @@ def efficient_frontier_tool(
             }
     
     # Проверяем доступность тикеров
-    available_tickers = get_available_tickers()
+    available_set = available_models.get_available_tickers()
     
     if not tickers:
         return {
             "error": "Не указаны тикеры для построения эффективной границы",
-            "available_tickers": available_tickers[:10]
+            "available_tickers": sorted(available_set)[:10]
         }
     
     # Фильтруем доступные тикеры
-    valid_tickers = [t for t in tickers if t in available_tickers]
-    invalid_tickers = [t for t in tickers if t not in available_tickers]
+    valid_tickers = [t for t in tickers if t in available_set]
+    invalid_tickers = [t for t in tickers if t not in available_set]
     
     if invalid_tickers:
         logger.warning(f"Недоступные тикеры: {invalid_tickers}")
@@ -89,7 +78,7 @@ def efficient_frontier_tool(
     if len(valid_tickers) < 3:
         return {
             "error": f"Для построения эффективной границы требуется минимум 3 доступных тикера, найдено {len(valid_tickers)}",
-            "available_tickers": available_tickers[:10],
+            "available_tickers": sorted(available_set)[:10],
             "invalid_tickers": invalid_tickers
         }
     
@@ -13,6 +13,7 @@ from catboost import CatBoostRegressor
 try:
     from ..market_snapshot.registry import SnapshotRegistry
     from ..market_snapshot.model import MarketSnapshot
+    from .available_models import get_available_tickers
 except ImportError:
     # Альтернативный импорт для Streamlit
     import sys
@@ -20,6 +21,7 @@ except ImportError:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'market_snapshot'))
     from registry import SnapshotRegistry
     from model import MarketSnapshot
+    from available_models import get_available_tickers
 
 logger = logging.getLogger(__name__)
 
@@ -252,9 +254,8 @@ def forecast_tool(
         Example: {"mu": 0.096, "sigma": 0.0147, "snapshot_id": "2023-01-01T12-00-00Z"}
         Note: mu and sigma are now 3-month values (quarterly).
     """
-    # Проверяем существование модели для данного тикера
-    model_path = MODELS_DIR / f"catboost_{ticker}.cbm"
-    if not model_path.exists():
+    # Проверяем существование модели для данного тикера (по кэшу содержимого каталога, без stat на каждый тикер)
+    if ticker not in get_available_tickers(MODELS_DIR):
         logger.warning(f"Модель для тикера {ticker} не найдена в {MODELS_DIR}")
         return {
             "mu": None, 
@@ -290,10 +291,6 @@ def forecast_tool(
     logger.info(f"Generating on-demand 3-month forecast for {ticker} (lookback: {lookback_days} days)")
     model_path = MODELS_DIR / f"catboost_{ticker}.cbm"
 
-    if not model_path.exists():
-        logger.error(f"CatBoost model not found for {ticker} at {model_path}")
-        return {"mu": None, "sigma": None, "snapshot_id": None, "error": f"Model for {ticker} not found"}
-
     try:
         model = CatBoostRegressor()
         model.load_model(str(model_path))
@@ -1,6 +1,7 @@
 import logging
-from typing import Dict, List, Any
-from pathlib import Path
+from typing import Dict, Any
+
+from . import available_models
 
 logger = logging.getLogger(__name__)
 
@@ -20,18 +21,6 @@ INDEX_COMPOSITIONS = {
     "consumer_staples": ["PG", "KO", "PEP", "WMT", "COST", "CL", "MO", "MDLZ", "KMB", "GIS"]
 }
 
-def get_available_tickers() -> List[str]:
-    """Получает список доступных тикеров на основе наличия моделей CatBoost."""
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    available_tickers = []
-    
-    for model_file in models_path.glob("catboost_*.cbm"):
-        ticker = model_file.stem.replace("catboost_", "")
-        if ticker:
-            available_tickers.append(ticker)
-    
-    return available_tickers
-
 def index_composition_tool(
     index_name: str,
     filter_available: bool = True
@@ -75,10 +64,9 @@ def index_composition_tool(
         }
     
     # Фильтруем по доступным тикерам
-    available_tickers = get_available_tickers()
-    
-    available_from_index = [ticker for ticker in full_composition if ticker in available_tickers]
-    unavailable_from_index = [ticker for ticker in full_composition if ticker not in available_tickers]
+    available_set = available_models.get_available_tickers()
+    available_from_index = [ticker for ticker in full_composition if ticker in available_set]
+    unavailable_from_index = [ticker for ticker in full_composition if ticker not in available_set]
     
     logger.info(f"Index {index_name}: {len(available_from_index)}/{len(full_composition)} tickers available")
     
@@ -123,12 +111,12 @@ def list_available_indices() -> Dict[str, Any]:
     }
     
     # Получаем доступность для каждого индекса
-    available_tickers = get_available_tickers()
+    available_set = available_models.get_available_tickers()
     results = {}
     
     for index_key, description in indices_info.items():
         composition = INDEX_COMPOSITIONS[index_key]
-        available_count = len([t for t in composition if t in available_tickers])
+        available_count = sum(1 for t in composition if t in available_set)
         
         results[index_key] = {
             "description": description,
@@ -139,7 +127,7 @@ def list_available_indices() -> Dict[str, Any]:
     
     return {
         "available_indices": results,
-        "total_available_models": len(available_tickers)
+        "total_available_models": len(available_set)
     }
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import logging
 from typing import Dict, Optional, List
-from pathlib import Path
 
 import pandas as pd
 import numpy as np
@@ -10,12 +9,14 @@ from pypfopt.hierarchical_portfolio import HRPOpt
 # Исправляем импорт для работы со Streamlit
 try:
     from ..market_snapshot.registry import SnapshotRegistry
+    from .available_models import get_available_tickers
 except ImportError:
     # Альтернативный импорт для Streamlit
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'market_snapshot'))
     from registry import SnapshotRegistry
+    from available_models import get_available_tickers
 
 logger = logging.getLogger(__name__)
 
@@ -67,22 +68,14 @@ def optimize_tool(
 
     logger.info(f"Optimizing portfolio with method '{method}' using snapshot '{snapshot_id}'.")
 
-    # Проверяем доступность тикеров
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    
-    # Получаем список доступных тикеров из директории с моделями
-    available_tickers = []
-    for model_file in models_path.glob("catboost_*.cbm"):
-        ticker = model_file.stem.replace("catboost_", "")
-        if ticker:
-            available_tickers.append(ticker)
-    
-    logger.info(f"Доступно {len(available_tickers)} тикеров для оптимизации")
+    # Проверяем доступность тикеров по списку моделей (кэшируется по mtime каталога)
+    available_set = get_available_tickers()
+    logger.info(f"Доступно {len(available_set)} тикеров для оптимизации")
     
     # Если предоставлен список тикеров, проверяем их наличие
     if tickers:
-        valid_tickers = [t for t in tickers if t in available_tickers]
-        invalid_tickers = [t for t in tickers if t not in available_tickers]
+        valid_tickers = [t for t in tickers if t in available_set]
+        invalid_tickers = [t for t in tickers if t not in available_set]
         
         if invalid_tickers:
             logger.warning(f"Следующие тикеры недоступны: {invalid_tickers}")
@@ -101,12 +94,13 @@ def optimize_tool(
     sigma_dict = snapshot.sigma
     
     # Фильтруем только доступные тикеры
-    available_mu_tickers = [t for t in mu_dict.keys() if t in available_tickers]
+    available_mu_tickers = [t for t in mu_dict.keys() if t in available_set]
     logger.info(f"В снэпшоте найдено {len(available_mu_tickers)} доступных тикеров")
     
     if tickers:
         # Если указаны конкретные тикеры, используем их пересечение с доступными
-        assets = [t for t in tickers if t in available_mu_tickers]
+        available_mu_set = frozenset(available_mu_tickers)
+        assets = [t for t in tickers if t in available_mu_set]
         logger.info(f"Из {len(tickers)} указанных тикеров доступно {len(assets)} в снэпшоте и моделях")
     else:
         # Иначе используем все доступные тикеры из снэпшота
@@ -2,10 +2,11 @@ import logging
 import pandas as pd
 import numpy as np
 import yfinance as yf
-import statsmodels.api as sm
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+from .yf_session import get_yf_session
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,19 +58,23 @@ def performance_tool(
         end_dt = pd.to_datetime(end_date)
         quarters_count = ((end_dt.year - start_dt.year) * 12 + (end_dt.month - start_dt.month)) / 3
         
-        # Загружаем цены активов (квартальные данные для соответствия с прогнозами)
+        # Загружаем цены активов и бенчмарка одним запросом (квартальные данные для
+        # соответствия с прогнозами): yfinance скачивает тикеры пакета параллельно
         tickers = list(weights.keys())
-        logger.info(f"Downloading price data for {len(tickers)} assets: {tickers}")
+        logger.info(f"Downloading price data for {len(tickers)} assets: {tickers} and benchmark {benchmark}")
+        
+        download_tickers = tickers + [benchmark] if benchmark not in tickers else tickers
+        all_prices = yf.download(download_tickers, start=start_date, end=end_date, interval="3mo", session=get_yf_session())["Close"]
         
-        prices = yf.download(tickers, start=start_date, end=end_date, interval="3mo")["Close"]
+        # Если только один тикер, yfinance может вернуть Series, конвертируем в DataFrame
+        if isinstance(all_prices, pd.Series):
+            all_prices = all_prices.to_frame(download_tickers[0])
+        
+        prices = all_prices[[t for t in tickers if t in all_prices.columns]].dropna(how="all")
         
         if prices.empty:
             return {"error": "Не удалось загрузить ценовые данные"}
         
-        # Если только один актив, yfinance возвращает Series, конвертируем в DataFrame
-        if isinstance(prices, pd.Series):
-            prices = prices.to_frame(tickers[0])
-        
         # Проверяем наличие данных для всех активов
         missing_tickers = [t for t in tickers if t not in prices.columns]
         if missing_tickers:
@@ -93,9 +98,10 @@ def performance_tool(
         weights_series = pd.Series(weights)
         portfolio_returns = (returns * weights_series).sum(axis=1)
         
-        # Загружаем данные бенчмарка
-        logger.info(f"Downloading benchmark data for {benchmark}")
-        benchmark_data = yf.download(benchmark, start=start_date, end=end_date, interval="3mo")["Close"]
+        # Данные бенчмарка
+        if benchmark not in all_prices.columns:
+            return {"error": f"Не удалось загрузить данные бенчмарка {benchmark}"}
+        benchmark_data = all_prices[benchmark].dropna()
         benchmark_returns = benchmark_data.pct_change().dropna()
         
         # Убеждаемся что benchmark_returns это Series
@@ -115,6 +121,13 @@ def performance_tool(
         if combined_data.empty:
             return {"error": "Нет пересекающихся данных портфеля и бенчмарка"}
         
+        # На 1-2 квартальных наблюдениях метрики (волатильность, регрессия CAPM) не имеют смысла
+        if len(combined_data) < 3:
+            return {
+                "error": f"Недостаточно наблюдений для анализа: {len(combined_data)} (нужно минимум 3). Увеличьте период анализа.",
+                "observations": len(combined_data)
+            }
+        
         # ===== РАСЧЕТ МЕТРИК =====
         
         # 1. Годовая доходность (аннуализация из квартальных данных)
@@ -132,27 +145,24 @@ def performance_tool(
             sharpe_ratio = 0
         
         # 4. Alpha и Beta через регрессию CAPM
-        X = sm.add_constant(combined_data["benchmark"])  # Добавляем константу для регрессии
-        y = combined_data["portfolio"]
+        try:
+            import statsmodels.api as sm  # Ленивый импорт: нужен только для регрессии
+        except ImportError as e:
+            # Без statsmodels Alpha/Beta не посчитать: возвращаем ошибку, а не значения по умолчанию
+            logger.error(f"statsmodels is required for CAPM regression: {e}")
+            return {"error": f"Для расчета Alpha/Beta требуется statsmodels: {str(e)}"}
         
-        # Убеждаемся что y и X имеют правильную размерность (1D)
-        if isinstance(y, pd.DataFrame):
-            y = y.iloc[:, 0] if y.shape[1] == 1 else y.squeeze()
-        if isinstance(X, pd.DataFrame) and X.shape[0] == 1:
-            # Если X имеет только одну строку, не можем выполнить регрессию
-            logger.warning("Insufficient data points for regression analysis")
-            beta = 1.0  # Дефолтная бета
-            alpha_annualized = 0.0  # Дефолтная альфа
-        else:
-            try:
-                model = sm.OLS(y, X).fit()
-                beta = float(model.params["benchmark"])
-                alpha_quarterly = float(model.params["const"])
-                alpha_annualized = alpha_quarterly * 4  # Годовая Alpha
-            except Exception as e:
-                logger.warning(f"Error in CAPM regression: {e}. Using default values.")
-                beta = 1.0
-                alpha_annualized = 0.0
+        y = combined_data["portfolio"]
+        try:
+            X = sm.add_constant(combined_data["benchmark"])  # Добавляем константу для регрессии
+            model = sm.OLS(y, X).fit()
+            beta = float(model.params["benchmark"])
+            alpha_quarterly = float(model.params["const"])
+            alpha_annualized = alpha_quarterly * 4  # Годовая Alpha
+        except Exception as e:
+            logger.warning(f"Error in CAPM regression: {e}. Using default values.")
+            beta = 1.0
+            alpha_annualized = 0.0
         
         # 5. Максимальная просадка
         cumulative_returns = (1 + combined_data["portfolio"]).cumprod()
@@ -4,22 +4,16 @@ import pandas as pd
 import yfinance as yf
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 from scipy import stats
 
+from . import available_models
+from .yf_session import get_yf_session
+
 logger = logging.getLogger(__name__)
 
-def get_available_tickers() -> List[str]:
-    """Получает список доступных тикеров на основе наличия моделей CatBoost."""
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    available_tickers = []
-    
-    for model_file in models_path.glob("catboost_*.cbm"):
-        ticker = model_file.stem.replace("catboost_", "")
-        if ticker:
-            available_tickers.append(ticker)
-    
-    return available_tickers
+# Константы аннуализации дневных показателей (торговых дней в году)
+_ANNUALIZE = 252
+_SQRT_ANNUALIZE = float(np.sqrt(_ANNUALIZE))
 
 def risk_analysis_tool(
     tickers: List[str] = None,
@@ -42,17 +36,17 @@ def risk_analysis_tool(
     logger.info(f"Performing risk analysis for tickers: {tickers}")
     
     # Проверяем доступность тикеров
-    available_tickers = get_available_tickers()
+    available_set = available_models.get_available_tickers()
     
     if not tickers:
         return {
             "error": "Не указаны тикеры для анализа",
-            "available_tickers": available_tickers[:10]  # Показываем первые 10 для примера
+            "available_tickers": sorted(available_set)[:10]  # Показываем первые 10 для примера
         }
     
     # Фильтруем доступные тикеры
-    valid_tickers = [t for t in tickers if t in available_tickers]
-    invalid_tickers = [t for t in tickers if t not in available_tickers]
+    valid_tickers = [t for t in tickers if t in available_set]
+    invalid_tickers = [t for t in tickers if t not in available_set]
     
     if invalid_tickers:
         logger.warning(f"Недоступные тикеры: {invalid_tickers}")
@@ -60,7 +54,7 @@ def risk_analysis_tool(
     if not valid_tickers:
         return {
             "error": f"Ни один из указанных тикеров не доступен. Недоступные: {invalid_tickers}",
-            "available_tickers": available_tickers[:10]
+            "available_tickers": sorted(available_set)[:10]
         }
     
     try:
@@ -70,47 +64,44 @@ def risk_analysis_tool(
         
         logger.info(f"Загружаем данные с {start_date.strftime('%Y-%m-%d')} по {end_date.strftime('%Y-%m-%d')}")
         
+        # Загружаем данные по всем тикерам одним пакетным запросом
+        data = yf.download(
+            valid_tickers,
+            start=start_date.strftime("%Y-%m-%d"),
+            end=end_date.strftime("%Y-%m-%d"),
+            progress=False,
+            auto_adjust=True,
+            session=get_yf_session()
+        )
+        
+        # Структуру колонок определяем один раз, а не на каждой итерации
+        if data is None or data.empty:
+            closes = pd.DataFrame(columns=valid_tickers)
+        elif isinstance(data.columns, pd.MultiIndex):
+            price_level = 1 if data.columns.names[1] == 'Price' else 0
+            closes = data.xs('Close', level=price_level, axis=1)
+        else:
+            closes = data[['Close']].set_axis(valid_tickers[:1], axis=1)
+        closes = closes.reindex(columns=valid_tickers)
+        
         # Собираем данные по всем тикерам
         prices_data = {}
         returns_data = {}
         
-        for ticker in valid_tickers:
-            try:
-                ticker_data = yf.download(
-                    ticker, 
-                    start=start_date.strftime("%Y-%m-%d"), 
-                    end=end_date.strftime("%Y-%m-%d"),
-                    progress=False,
-                    auto_adjust=True
-                )
-                
-                if ticker_data.empty:
-                    logger.warning(f"Нет данных для {ticker}")
-                    continue
-                
-                # Получаем цены закрытия
-                close_column = 'Close'
-                if isinstance(ticker_data.columns, pd.MultiIndex):
-                    try:
-                        close_prices = ticker_data.xs('Close', level=0, axis=1)
-                        if isinstance(close_prices, pd.DataFrame) and len(close_prices.columns) == 1:
-                            close_prices = close_prices.iloc[:, 0]
-                    except:
-                        close_prices = ticker_data.iloc[:, 3]  # Обычно Close - 4-я колонка
-                else:
-                    close_prices = ticker_data[close_column]
-                
-                # Рассчитываем логарифмические доходности
-                log_returns = np.log(close_prices / close_prices.shift(1)).dropna()
-                
-                prices_data[ticker] = close_prices
-                returns_data[ticker] = log_returns
-                
-                logger.info(f"Загружено {len(log_returns)} наблюдений для {ticker}")
-                
-            except Exception as e:
-                logger.error(f"Ошибка загрузки данных для {ticker}: {e}")
+        for j, ticker in enumerate(valid_tickers):
+            close_prices = closes.iloc[:, j].dropna()
+            
+            if close_prices.empty:
+                logger.warning(f"Нет данных для {ticker}")
                 continue
+            
+            # Рассчитываем логарифмические доходности
+            log_returns = np.log(close_prices / close_prices.shift(1)).dropna()
+            
+            prices_data[ticker] = close_prices
+            returns_data[ticker] = log_returns
+            
+            logger.info(f"Загружено {len(log_returns)} наблюдений для {ticker}")
         
         if not returns_data:
             return {
@@ -119,8 +110,9 @@ def risk_analysis_tool(
                 "valid_tickers": valid_tickers
             }
         
-        # Создаем DataFrame с доходностями
-        returns_df = pd.DataFrame(returns_data)
+        # Создаем DataFrame с доходностями (float32 достаточно для дневных доходностей
+        # и вдвое сокращает объем памяти при сканировании большого числа тикеров)
+        returns_df = pd.DataFrame({t: v.astype(np.float32) for t, v in returns_data.items()})
         returns_df = returns_df.dropna()
         
         if returns_df.empty:
@@ -145,19 +137,35 @@ def risk_analysis_tool(
             "drawdown_analysis": {}
         }
         
+        # Моменты распределения и тест Jarque-Bera сразу по всем тикерам
+        returns_matrix = returns_df.to_numpy()
+        n_obs = returns_matrix.shape[0]
+        deviations = returns_matrix - returns_matrix.mean(axis=0)
+        m2 = (deviations ** 2).mean(axis=0)
+        m3 = (deviations ** 3).mean(axis=0)
+        m4 = (deviations ** 4).mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g1 = m3 / m2 ** 1.5
+            g2 = m4 / m2 ** 2 - 3
+        jb_stats = n_obs / 6 * (g1 ** 2 + g2 ** 2 / 4)
+        jb_pvalues = stats.chi2.sf(jb_stats, 2)
+        # Несмещенные оценки, как в pandas .skew() / .kurtosis()
+        skewness = g1 * np.sqrt(n_obs * (n_obs - 1)) / (n_obs - 2) if n_obs > 2 else np.full_like(g1, np.nan)
+        kurtosis = ((n_obs + 1) * g2 + 6) * (n_obs - 1) / ((n_obs - 2) * (n_obs - 3)) if n_obs > 3 else np.full_like(g2, np.nan)
+        
         # Анализ рисков отдельных активов
-        for ticker in returns_df.columns:
+        for j, ticker in enumerate(returns_df.columns):
             ticker_returns = returns_df[ticker]
             
             # Базовая статистика
-            annual_return = ticker_returns.mean() * 252
-            annual_volatility = ticker_returns.std() * np.sqrt(252)
+            annual_return = ticker_returns.mean() * _ANNUALIZE
+            annual_volatility = ticker_returns.std() * _SQRT_ANNUALIZE
             
             # VaR и Expected Shortfall
             var_daily = np.percentile(ticker_returns, (1 - confidence_level) * 100)
-            var_annual = var_daily * np.sqrt(252)
+            var_annual = var_daily * _SQRT_ANNUALIZE
             es_daily = ticker_returns[ticker_returns <= var_daily].mean() if len(ticker_returns[ticker_returns <= var_daily]) > 0 else var_daily
-            es_annual = es_daily * np.sqrt(252)
+            es_annual = es_daily * _SQRT_ANNUALIZE
             
             # Максимальная просадка
             cumulative = (1 + ticker_returns).cumprod()
@@ -166,7 +174,7 @@ def risk_analysis_tool(
             max_drawdown = drawdown.min()
             
             # Тестирование нормальности (Jarque-Bera)
-            jb_stat, jb_pvalue = stats.jarque_bera(ticker_returns.dropna())
+            jb_stat, jb_pvalue = jb_stats[j], jb_pvalues[j]
             
             results["individual_risks"][ticker] = {
                 "annual_return": float(annual_return),
@@ -177,8 +185,8 @@ def risk_analysis_tool(
                 "expected_shortfall_daily": float(es_daily),
                 "expected_shortfall_annual": float(es_annual),
                 "max_drawdown": float(max_drawdown),
-                "skewness": float(ticker_returns.skew()),
-                "kurtosis": float(ticker_returns.kurtosis()),
+                "skewness": float(skewness[j]),
+                "kurtosis": float(kurtosis[j]),
                 "jarque_bera_stat": float(jb_stat),
                 "jarque_bera_pvalue": float(jb_pvalue),
                 "is_normal_distribution": bool(jb_pvalue > 0.05)
@@ -209,15 +217,17 @@ def risk_analysis_tool(
                 portfolio_weights = {k: v/total_weight for k, v in portfolio_weights.items()}
                 
                 # Рассчитываем портфельные доходности
-                portfolio_returns = sum(returns_df[ticker] * weight for ticker, weight in portfolio_weights.items())
+                tickers_ordered = list(portfolio_weights)
+                w = np.array([portfolio_weights[t] for t in tickers_ordered], dtype=np.float32)
+                portfolio_returns = pd.Series(returns_df[tickers_ordered].to_numpy() @ w, index=returns_df.index)
                 
                 # Портфельная статистика
-                portfolio_annual_return = portfolio_returns.mean() * 252
-                portfolio_annual_volatility = portfolio_returns.std() * np.sqrt(252)
+                portfolio_annual_return = portfolio_returns.mean() * _ANNUALIZE
+                portfolio_annual_volatility = portfolio_returns.std() * _SQRT_ANNUALIZE
                 
                 # Портфельный VaR
                 portfolio_var_daily = np.percentile(portfolio_returns, (1 - confidence_level) * 100)
-                portfolio_var_annual = portfolio_var_daily * np.sqrt(252)
+                portfolio_var_annual = portfolio_var_daily * _SQRT_ANNUALIZE
                 
                 # Максимальная просадка портфеля
                 portfolio_cumulative = (1 + portfolio_returns).cumprod()
@@ -249,7 +259,7 @@ def risk_analysis_tool(
                 var_daily = np.percentile(returns_df[ticker], (1 - level) * 100)
                 level_results[ticker] = {
                     "var_daily": float(var_daily),
-                    "var_annual": float(var_daily * np.sqrt(252))
+                    "var_annual": float(var_daily * _SQRT_ANNUALIZE)
                 }
             results["var_analysis"]["confidence_levels"][f"{level:.0%}"] = level_results
         
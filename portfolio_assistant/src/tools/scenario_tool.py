@@ -1,22 +1,41 @@
-import hashlib
 import json
+import logging
+import struct
 from datetime import datetime, timezone
-from typing import Dict, List, Any
-from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 
+import orjson
+import xxhash
 from pydantic import Field, BaseModel, ValidationError
 
 from ..market_snapshot.model import MarketSnapshot, SnapshotMeta
 from ..market_snapshot.registry import SnapshotRegistry
+from .available_models import get_available_tickers
+
+logger = logging.getLogger(__name__)
+
+# --- Инициализация --- #
+_snapshot_registry = None
 
 # Pydantic модель для одной корректировки тикера
 class TickerAdjustment(BaseModel):
     ticker: str = Field(..., description="The ticker symbol for the adjustment.")
     delta: float = Field(..., description="The delta adjustment value for the ticker's 'mu'.")
 
-def _generate_short_hash(data_string: str, length: int = 8) -> str:
-    """Helper to generate a short, deterministic hash for snapshot ID suffixes."""
-    return hashlib.sha256(data_string.encode()).hexdigest()[:length]
+def _get_snapshot_registry() -> SnapshotRegistry:
+    """Один SnapshotRegistry (и его пул соединений Redis) на процесс вместо нового на каждый вызов."""
+    global _snapshot_registry
+    if _snapshot_registry is None:
+        _snapshot_registry = SnapshotRegistry()
+    return _snapshot_registry
+
+def _generate_short_hash(items: Iterable[Tuple[str, float]], length: int = 8) -> str:
+    """Helper to generate a short, deterministic hash of (ticker, delta) pairs for snapshot ID suffixes."""
+    h = xxhash.xxh3_64()
+    for ticker, delta in sorted(items):
+        h.update(ticker.encode())
+        h.update(struct.pack("<d", delta))
+    return h.hexdigest()[:length]
 
 def _internal_scenario_adjust_tool_logic(snapshot_id: str, deltas_json_string: str) -> str:
     """
@@ -30,76 +49,131 @@ def _internal_scenario_adjust_tool_logic(snapshot_id: str, deltas_json_string: s
                             Example: '[{"ticker": "AAPL", "delta": -0.01}, {"ticker": "MSFT", "delta": 0.005}]'
 
     Returns:
-        The ID of the newly created and saved scenario snapshot.
+        The ID of the newly created and saved scenario snapshot,
+        or snapshot_id itself if the adjustments list is empty.
     """
-    registry = SnapshotRegistry()
-    original_snapshot = registry.load(snapshot_id)
-    if not original_snapshot:
-        raise ValueError(f"Snapshot with ID '{snapshot_id}' not found.")
-
     try:
-        adjustments_list_raw = json.loads(deltas_json_string)
-    except json.JSONDecodeError as e:
+        adjustments_list_raw = orjson.loads(deltas_json_string)
+    except orjson.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON format for deltas_json_string: {e}. Input was: {deltas_json_string}")
 
     if not isinstance(adjustments_list_raw, list):
         raise TypeError(f"Parsed deltas_json_string must be a list, got {type(adjustments_list_raw)}. Parsed data: {adjustments_list_raw}")
 
     deltas: Dict[str, float] = {}
-    processed_adjustments: List[TickerAdjustment] = []
     for i, item_raw in enumerate(adjustments_list_raw):
         if not isinstance(item_raw, dict):
             raise TypeError(f"Each item in the parsed list must be a dictionary, item at index {i} is {type(item_raw)}. Item: {item_raw}")
-        try:
-            adjustment = TickerAdjustment(**item_raw)
-            processed_adjustments.append(adjustment)
-        except ValidationError as e:
-            raise ValueError(f"Invalid data for TickerAdjustment at index {i}: {e}. Input was: {item_raw}")
-
-    for item in processed_adjustments:
-        if item.ticker in deltas:
-            print(f"Warning: Duplicate ticker '{item.ticker}' in adjustments list. Using the latest value: {item.delta}")
-        deltas[item.ticker] = item.delta
-    
-    new_mu = original_snapshot.mu.copy()
+        ticker = item_raw.get("ticker")
+        delta = item_raw.get("delta")
+        # Быстрый путь для корректных элементов; TickerAdjustment нужен только для приведения типов и текста ошибки
+        if type(ticker) is str and type(delta) in (float, int):
+            delta = float(delta)
+        else:
+            try:
+                adjustment = TickerAdjustment(**item_raw)
+            except ValidationError as e:
+                raise ValueError(f"Invalid data for TickerAdjustment at index {i}: {e}. Input was: {item_raw}")
+            ticker, delta = adjustment.ticker, adjustment.delta
+        if ticker in deltas:
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning("Duplicate ticker '%s' in adjustments list. Using the latest value: %s", ticker, delta)
+        deltas[ticker] = delta
+
+    return _internal_scenario_adjust_tool_logic_dict(snapshot_id, deltas)
+
+def _internal_scenario_adjust_tool_logic_dict(
+    snapshot_id: str,
+    deltas: Dict[str, float],
+    original_snapshot: Optional[MarketSnapshot] = None,
+) -> str:
+    """
+    Same as _internal_scenario_adjust_tool_logic, but takes already validated deltas
+    as a {ticker: delta} dict, skipping the JSON round-trip and per-item validation.
+
+    Args:
+        snapshot_id: The ID of the base market snapshot to use.
+        deltas: Mapping of ticker to the delta added to its 'mu'.
+        original_snapshot: The base snapshot if the caller has already loaded it;
+                           otherwise it is loaded from the registry by snapshot_id.
+
+    Returns:
+        The ID of the newly created and saved scenario snapshot,
+        or snapshot_id itself if deltas is empty.
+
+    Note:
+        The root id is taken from properties["root_snapshot_id"], then
+        properties["base_snapshot_id"], then meta.id. Scenarios saved before
+        root_snapshot_id was recorded only carry their immediate parent, so a
+        scenario built on top of such a scenario-of-a-scenario records that
+        intermediate parent as its root instead of the true root.
+    """
+    registry = _get_snapshot_registry()
+    if original_snapshot is None:
+        original_snapshot = registry.load(snapshot_id)
+        if not original_snapshot:
+            raise ValueError(f"Snapshot with ID '{snapshot_id}' not found.")
+
+    # Пустой список корректировок ничего не меняет: новый снапшот не создается
+    if not deltas:
+        return snapshot_id
+
+    new_mu = dict(original_snapshot.mu)
     for ticker, delta_value in deltas.items():
         if ticker in new_mu:
             new_mu[ticker] += delta_value
         else:
-            print(f"Warning: Ticker '{ticker}' in deltas not found in original snapshot's mu. Adjustment for this ticker will be skipped.")
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning("Ticker '%s' in deltas not found in original snapshot's mu. Adjustment for this ticker will be skipped.", ticker)
 
-    deltas_repr = json.dumps(deltas, sort_keys=True)
-    scenario_suffix = f"scn-{_generate_short_hash(deltas_repr)}"
+    scenario_suffix = f"scn-{_generate_short_hash(deltas.items())}"
     
-    base_id_for_new = original_snapshot.meta.id.split('-scn-')[0]
+    # Корневой снапшот цепочки сценариев хранится в properties, ID не разбирается.
+    # base_snapshot_id указывает на непосредственного родителя (для сценариев старого формата он же корень)
+    original_properties = getattr(original_snapshot.meta, 'properties', None) or {}
+    base_id_for_new = (
+        original_properties.get("root_snapshot_id")
+        or original_properties.get("base_snapshot_id")
+        or original_snapshot.meta.id
+    )
     new_id = f"{base_id_for_new}-{scenario_suffix}"
     
     new_meta_properties = {
-        **(getattr(original_snapshot.meta, 'properties', None) or {}),
+        **original_properties,
         "base_snapshot_id": original_snapshot.meta.id,
+        "root_snapshot_id": base_id_for_new,
         "applied_deltas": deltas
     }
 
+    created_at = datetime.now(timezone.utc)
+    asset_universe = list(original_snapshot.meta.tickers)
+    # model_construct обходит SnapshotMeta.__init__, поэтому обе пары алиасов задаются явно
     meta_kwargs_for_new = {
         "id": new_id,
-        "asset_universe": original_snapshot.meta.tickers,
-        "created_at": datetime.now(timezone.utc),
+        "snapshot_id": new_id,
+        "asset_universe": asset_universe,
+        "tickers": asset_universe,
+        "created_at": created_at,
+        "timestamp": created_at,
         "horizon_days": getattr(original_snapshot.meta, "horizon_days", 30),
-        "description": f"Scenario based on {original_snapshot.meta.id} with deltas applied. Deltas: {deltas_repr}",
+        "description": f"Scenario based on {original_snapshot.meta.id} with deltas applied. Deltas: {json.dumps(deltas, sort_keys=True)}",
         "source": "scenario_adjustment_tool",
         "properties": new_meta_properties,
     }
 
-    new_meta = SnapshotMeta(**meta_kwargs_for_new)
+    # Все значения уже провалидированы (исходный снапшот и дельты), повторная валидация не нужна
+    new_meta = SnapshotMeta.model_construct(**meta_kwargs_for_new)
 
-    scenario_snapshot = MarketSnapshot(
+    # Сценарий меняет только mu, остальные поля берутся из исходного снапшота без копирования.
+    # model_construct не перевалидирует поля: валидация Pydantic пересобрала бы словари sigma/prices/...
+    scenario_snapshot = MarketSnapshot.model_construct(
         meta=new_meta,
         mu=new_mu,
-        sigma=original_snapshot.sigma.copy(), 
-        market_caps=original_snapshot.market_caps.copy() if original_snapshot.market_caps else None,
-        prices=original_snapshot.prices.copy() if original_snapshot.prices else None,
-        sentiment=original_snapshot.sentiment.copy() if hasattr(original_snapshot, 'sentiment') and original_snapshot.sentiment else None,
-        raw_features_path=original_snapshot.raw_features_path if hasattr(original_snapshot, 'raw_features_path') else None
+        sigma=original_snapshot.sigma,
+        market_caps=original_snapshot.market_caps,
+        prices=original_snapshot.prices,
+        sentiment=getattr(original_snapshot, 'sentiment', None),
+        raw_features_path=getattr(original_snapshot, 'raw_features_path', None)
     )
 
     registry.save(scenario_snapshot)
@@ -118,15 +192,9 @@ def scenario_adjust_tool(tickers: List[str], adjustments: Dict[str, float], base
     Returns:
         Dictionary with details about the created scenario snapshot
     """
-    # Проверяем наличие тикеров в списке доступных
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    
-    # Проверяем доступность тикеров из основного списка
-    unavailable_tickers = []
-    for ticker in tickers:
-        model_path = models_path / f"catboost_{ticker}.cbm"
-        if not model_path.exists():
-            unavailable_tickers.append(ticker)
+    # Проверяем наличие тикеров в списке доступных (frozenset из кэша available_models)
+    available = get_available_tickers()
+    unavailable_tickers = [t for t in tickers if t not in available]
     
     if unavailable_tickers:
         return {
@@ -135,11 +203,7 @@ def scenario_adjust_tool(tickers: List[str], adjustments: Dict[str, float], base
         }
     
     # Проверяем доступность тикеров из корректировок
-    unavailable_adj_tickers = []
-    for ticker in adjustments.keys():
-        model_path = models_path / f"catboost_{ticker}.cbm"
-        if not model_path.exists():
-            unavailable_adj_tickers.append(ticker)
+    unavailable_adj_tickers = [t for t in adjustments if t not in available]
     
     if unavailable_adj_tickers:
         return {
@@ -147,7 +211,7 @@ def scenario_adjust_tool(tickers: List[str], adjustments: Dict[str, float], base
             "snapshot_id": None
         }
     
-    registry = SnapshotRegistry()
+    registry = _get_snapshot_registry()
     
     # Получаем базовый снапшот
     if base_snapshot_id:
@@ -166,18 +230,22 @@ def scenario_adjust_tool(tickers: List[str], adjustments: Dict[str, float], base
             }
         base_snapshot_id = original_snapshot.meta.id
     
-    # Формируем список корректировок в формате для внутреннего метода
-    adjustments_list = []
-    for ticker, delta in adjustments.items():
-        adjustments_list.append({
-            "ticker": ticker,
-            "delta": delta / 100.0  # Переводим проценты в десятичную дробь
-        })
+    if not adjustments:
+        # Без корректировок сценарий совпадает с базовым снапшотом
+        return {
+            "snapshot_id": base_snapshot_id,
+            "base_snapshot_id": base_snapshot_id,
+            "tickers": tickers,
+            "adjustments": adjustments,
+            "error": None
+        }
     
-    deltas_json_string = json.dumps(adjustments_list)
+    # Переводим проценты в десятичную дробь; данные уже проверены выше, JSON не нужен
+    deltas = {ticker: delta / 100.0 for ticker, delta in adjustments.items()}
     
     try:
-        new_snapshot_id = _internal_scenario_adjust_tool_logic(base_snapshot_id, deltas_json_string)
+        # Базовый снапшот уже загружен выше: повторный load из Redis/S3 не нужен
+        new_snapshot_id = _internal_scenario_adjust_tool_logic_dict(base_snapshot_id, deltas, original_snapshot)
         return {
             "snapshot_id": new_snapshot_id,
             "base_snapshot_id": base_snapshot_id,
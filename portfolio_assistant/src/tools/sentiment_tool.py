@@ -1,15 +1,26 @@
 import os
+import sys
+import asyncio
+import concurrent.futures
 import logging
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
-import json
 from pathlib import Path
 
+import aiohttp
+import msgpack
+import orjson
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from newsapi import NewsApiClient
 import redis
 
+try:
+    from .available_models import MODELS_DIR, get_available_tickers
+except ImportError:
+    # Запуск как скрипта (python sentiment_tool.py --export-torchscript)
+    from available_models import MODELS_DIR, get_available_tickers
+
 logger = logging.getLogger(__name__)
 
 # --- Конфигурация --- #
@@ -17,8 +28,16 @@ NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
 if not NEWSAPI_KEY:
     logger.warning("NEWSAPI_KEY environment variable not set. Sentiment tool will not fetch live news.")
 
+NEWSAPI_EVERYTHING_URL = "https://newsapi.org/v2/everything"
+NEWSAPI_TIMEOUT_SECONDS = 10
 MODEL_NAME = "ProsusAI/finbert"
+MAX_HEADLINE_TOKENS = 64
+# Предварительно оттрассированная TorchScript-версия FinBERT (см. export_torchscript_model)
+TORCHSCRIPT_PATH = Path(os.getenv("FINBERT_TORCHSCRIPT_PATH", MODELS_DIR / "finbert.ts"))
+# На GPU модель выполняется в FP16; int8-квантизация и TorchScript-экспорт применяются только на CPU
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 CACHE_TTL_SECONDS = 900  # 15 минут
+CACHE_KEY_PREFIX = "sentiment" # Пространство имен ключей кэша в Redis
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0 # Используйте другую БД, если основная занята
@@ -29,24 +48,81 @@ _model = None
 _redis_client = None
 _newsapi_client = None
 
+def _quantize_model(model):
+    """Заменяет nn.Linear слои модели на int8 (динамическая квантизация) для ускорения инференса на CPU."""
+    if not isinstance(model, torch.nn.Module):
+        return model
+    try:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        logger.warning(f"Dynamic quantization of {MODEL_NAME} failed, using FP32 model: {e}")
+    model.eval()
+    return model
+
 def _get_tokenizer_model():
     global _tokenizer, _model
     if _tokenizer is None or _model is None:
         logger.info(f"Loading tokenizer and model for {MODEL_NAME}...")
         try:
-            _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-            _model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+            _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+            if DEVICE == "cuda":
+                _model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+                _model = _model.to(DEVICE).half().eval()
+            elif TORCHSCRIPT_PATH.exists():
+                # Готовый граф загружается без сборки Python-модулей модели
+                _model = torch.jit.load(str(TORCHSCRIPT_PATH), map_location="cpu")
+                _model.eval()
+            else:
+                _model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+                _model = _quantize_model(_model)
             logger.info(f"Tokenizer and model {MODEL_NAME} loaded successfully.")
         except Exception as e:
             logger.error(f"Error loading HuggingFace model {MODEL_NAME}: {e}", exc_info=True)
             # Не поднимаем исключение, чтобы инструмент мог вернуть ошибку штатно
     return _tokenizer, _model
 
+def export_torchscript_model(path: Path = TORCHSCRIPT_PATH) -> Path:
+    """
+    Трассирует квантизованную модель FinBERT в TorchScript и сохраняет ее на диск.
+
+    При наличии файла _get_tokenizer_model загружает модель через torch.jit.load,
+    что сокращает время холодного старта. Запускается один раз:
+    python -m src.tools.sentiment_tool --export-torchscript
+
+    Args:
+        path: Куда сохранить оттрассированную модель.
+
+    Returns:
+        Путь к сохраненному файлу.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    # return_dict=False: трассировщик принимает на выходе только кортеж (torchscript=True этого не гарантирует в transformers 5)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME, torchscript=True, return_dict=False)
+    model = _quantize_model(model)
+    example = tokenizer(["Example headline"], return_tensors="pt", truncation=True,
+                        max_length=MAX_HEADLINE_TOKENS, padding="max_length")
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, (example["input_ids"], example["attention_mask"]))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    traced.save(str(path))
+    logger.info(f"TorchScript model for {MODEL_NAME} saved to {path}")
+    return path
+
+def _model_logits(model, inputs) -> torch.Tensor:
+    """Возвращает логиты как для HF-модели, так и для оттрассированной TorchScript-версии."""
+    if isinstance(model, torch.jit.ScriptModule):
+        return model(inputs["input_ids"], inputs["attention_mask"])[0]
+    return model(**inputs).logits
+
+def _cache_key(ticker: str, window_days: int) -> str:
+    return f"{CACHE_KEY_PREFIX}:{ticker}:{window_days}" # window_days входит в ключ кэша
+
 def _get_redis_client():
     global _redis_client
     if _redis_client is None:
         try:
-            _redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+            _redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=False) # Значения кэша хранятся в msgpack (байты)
             _redis_client.ping() # Проверка соединения
             logger.info(f"Connected to Redis at {REDIS_HOST}:{REDIS_PORT}")
         except redis.exceptions.ConnectionError as e:
@@ -93,36 +169,150 @@ def _fetch_news_from_api(ticker: str, window_days: int) -> List[Dict[str, Any]]:
         logger.error(f"Exception fetching news for '{ticker}': {e}", exc_info=True)
         return []
 
-def _calculate_sentiment_score(headlines: List[str]) -> float:
-    if not headlines:
-        return 0.0
+async def _fetch_news_async(session: aiohttp.ClientSession, ticker: str, window_days: int) -> List[Dict[str, Any]]:
+    """Асинхронный аналог _fetch_news_from_api: тот же запрос к NewsAPI через aiohttp."""
+    to_date = datetime.now(timezone.utc)
+    from_date = to_date - timedelta(days=window_days)
+    params = {
+        "q": ticker,
+        "from": from_date.strftime('%Y-%m-%d'),
+        "to": to_date.strftime('%Y-%m-%d'),
+        "language": "en",
+        "sortBy": "relevancy",
+        "pageSize": 20,
+    }
+    # Ключ передается заголовком, а не параметром запроса, чтобы не попадать в URL в логах и трейсбеках
+    headers = {"X-Api-Key": NEWSAPI_KEY}
+
+    try:
+        logger.info(f"Fetching news for '{ticker}' from {params['from']} to {params['to']}")
+        async with session.get(NEWSAPI_EVERYTHING_URL, params=params, headers=headers) as response:
+            if response.status != 200:
+                logger.error(f"NewsAPI HTTP {response.status} for '{ticker}': {response.reason}")
+                return []
+            articles_response = await response.json()
+        if articles_response.get('status') == 'ok':
+            logger.info(f"Fetched {len(articles_response['articles'])} articles for '{ticker}'.")
+            return articles_response['articles']
+        else:
+            logger.error(f"NewsAPI error for '{ticker}': {articles_response.get('message')}")
+            return []
+    except Exception as e:
+        logger.error(f"Exception fetching news for '{ticker}': {e}", exc_info=True)
+        return []
+
+async def _fetch_news_for_tickers_async(tickers: List[str], window_days: int) -> List[List[Dict[str, Any]]]:
+    """
+    Загружает новости сразу для нескольких тикеров параллельно (asyncio + aiohttp).
+    Задержки сетевых запросов перекрываются, а не суммируются. Вызывается напрямую из асинхронного кода.
+    """
+    if not NEWSAPI_KEY:
+        logger.warning("NEWSAPI_KEY is not set. Returning no news.")
+        return [[] for _ in tickers]
+    timeout = aiohttp.ClientTimeout(total=NEWSAPI_TIMEOUT_SECONDS)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(*(_fetch_news_async(session, ticker, window_days) for ticker in tickers))
+
+def _fetch_news_for_tickers(tickers: List[str], window_days: int) -> List[List[Dict[str, Any]]]:
+    """
+    Синхронная обертка над _fetch_news_for_tickers_async для вызова из инструментов.
+    asyncio.run нельзя вызвать внутри работающего цикла событий (асинхронный бот),
+    поэтому в этом случае загрузка выполняется в отдельном потоке со своим циклом.
+
+    Внимание: в этом случае вызывающий поток ждет результат синхронно, и его цикл
+    событий блокируется на время загрузки (до NEWSAPI_TIMEOUT_SECONDS). Асинхронный
+    код должен вызывать await _fetch_news_for_tickers_async(...) напрямую.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_fetch_news_for_tickers_async(tickers, window_days))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _fetch_news_for_tickers_async(tickers, window_days)).result()
+
+def _calculate_sentiment_scores(headline_groups: List[List[str]]) -> List[float]:
+    """Средний сентимент для каждой группы заголовков; все группы проходят через модель одним батчем."""
+    if not headline_groups:
+        return []
+    scores = [0.0] * len(headline_groups)
 
     tokenizer, model = _get_tokenizer_model()
     if tokenizer is None or model is None: # <--- ВОТ ОНА!
         logger.error("Sentiment model not available. Cannot calculate score.")
-        return 0.0
+        return scores
+
+    headline_groups = [[h for h in headlines if h and isinstance(h, str)] for headlines in headline_groups]
+    group_sizes = [len(headlines) for headlines in headline_groups]
+    headlines = [h for group in headline_groups for h in group]
+    if not headlines:
+        return scores
 
-    sentiment_scores = []
     try:
-        with torch.no_grad(): # Отключаем расчет градиентов для инференса
-            for headline in headlines:
-                if not headline or not isinstance(headline, str):
-                    continue
-                inputs = tokenizer(headline, return_tensors="pt", truncation=True, max_length=512, padding=True)
-                outputs = model(**inputs)
-                probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-                # probs[0] это [positive_prob, negative_prob, neutral_prob]
-                positive_prob = probs[0][0].item() # Индекс 0 для positive в ProsusAI/finbert
-                negative_prob = probs[0][1].item() # Индекс 1 для negative
-                # neutral_prob = probs[0][2].item()
-                sentiment_scores.append(positive_prob - negative_prob)
+        # Все заголовки обрабатываются одним батчем за один прямой проход модели.
+        # Заголовки короткие, поэтому max_length=64 вместо 512.
+        # TorchScript-граф трассирован на фиксированной длине, поэтому для него дополняем до max_length.
+        # Быстрый (Rust) токенизатор обрабатывает весь список одним вызовом
+        padding = "max_length" if isinstance(model, torch.jit.ScriptModule) else True
+        inputs = tokenizer(headlines, padding=padding, truncation=True,
+                           max_length=MAX_HEADLINE_TOKENS, return_tensors="pt")
+        if DEVICE == "cuda":
+            # Копирование из закрепленной (pinned) памяти идет асинхронно
+            inputs = {key: value.pin_memory().to(DEVICE, non_blocking=True) for key, value in inputs.items()}
+        with torch.inference_mode(): # Инференс без отслеживания градиентов и версий тензоров
+            logits = _model_logits(model, inputs)
+        probs = torch.softmax(logits.float(), dim=-1) # softmax в FP32 даже при FP16-модели
+        # Колонки probs: [positive, negative, neutral] в ProsusAI/finbert
+        headline_scores = probs[:, 0] - probs[:, 1]
+        # Средние по группам считаются одной сегментной суммой и одной синхронизацией с устройством
+        counts = torch.tensor(group_sizes, device=headline_scores.device)
+        group_ids = torch.repeat_interleave(torch.arange(len(group_sizes), device=headline_scores.device), counts)
+        sums = torch.zeros(len(group_sizes), dtype=headline_scores.dtype, device=headline_scores.device)
+        sums.index_add_(0, group_ids, headline_scores)
+        return (sums / counts.clamp(min=1)).tolist()
     except Exception as e:
         logger.error(f"Error during sentiment calculation with FinBERT: {e}", exc_info=True)
-        return 0.0 # Возвращаем нейтральный в случае ошибки модели
+        return [0.0] * len(headline_groups) # Возвращаем нейтральный в случае ошибки модели
 
-    if not sentiment_scores:
+def _calculate_sentiment_score(headlines: List[str]) -> float:
+    if not headlines:
         return 0.0
-    return sum(sentiment_scores) / len(sentiment_scores)
+    return _calculate_sentiment_scores([headlines])[0]
+
+def _headlines_from_articles(news_articles: List[Dict[str, Any]]) -> List[str]:
+    # Берем только статьи, у которых есть заголовок
+    return [article['title'] for article in news_articles if article.get('title')]
+
+def _sentiment_result(ticker: str, window_days: int, headlines: List[str], score: float) -> Dict[str, Any]:
+    if not headlines:
+        logger.info(f"No relevant headlines found for '{ticker}' in the last {window_days} days.")
+        return {
+            "score": 0.0,
+            "articles_count": 0,
+            "error": f"Не найдены новости для тикера {ticker} за последние {window_days} дней."
+        }
+    return {
+        "score": score,
+        "articles_count": len(headlines),
+        "error": None
+    }
+
+def _decode_cached_sentiment(cached_result: bytes) -> Dict[str, Any]:
+    try:
+        result = msgpack.unpackb(cached_result, raw=False)
+        if isinstance(result, dict):
+            return result
+    except ValueError:
+        pass
+    # Записи старого формата (JSON или просто число) остаются в кэше до истечения TTL
+    try:
+        return orjson.loads(cached_result)
+    except orjson.JSONDecodeError:
+        # Если в кэше не словарь, а просто число (обратная совместимость)
+        return {
+            "score": float(cached_result),
+            "articles_count": 0,
+            "error": None
+        }
 
 
 def sentiment_tool(ticker: str, window_days: int = 3) -> Dict[str, Any]:
@@ -141,10 +331,8 @@ def sentiment_tool(ticker: str, window_days: int = 3) -> Dict[str, Any]:
         Example: {"score": 0.75, "articles_count": 10, "error": None}
     """
     # Проверяем существование модели для данного тикера
-    models_path = Path(__file__).absolute().parent.parent.parent.parent / "models"
-    model_path = models_path / f"catboost_{ticker}.cbm"
-    if not model_path.exists():
-        logger.warning(f"Модель для тикера {ticker} не найдена в {models_path}")
+    if ticker not in get_available_tickers():
+        logger.warning(f"Модель для тикера {ticker} не найдена в {MODELS_DIR}")
         return {
             "score": 0.0,
             "articles_count": 0,
@@ -164,23 +352,14 @@ def sentiment_tool(ticker: str, window_days: int = 3) -> Dict[str, Any]:
     _get_tokenizer_model() # Загружаем модель заранее, если еще не загружена
     redis_cli = _get_redis_client()
     
-    cache_key = f"sentiment:{ticker}:{window_days}" # Добавляем window_days в ключ кэша
+    cache_key = _cache_key(ticker, window_days)
 
     if redis_cli:
         try:
             cached_result = redis_cli.get(cache_key)
             if cached_result is not None:
                 logger.info(f"Returning cached sentiment for '{ticker}' (window: {window_days} days)")
-                try:
-                    result = json.loads(cached_result)
-                    return result
-                except json.JSONDecodeError:
-                    # Если в кэше не словарь, а просто число (обратная совместимость)
-                    return {
-                        "score": float(cached_result),
-                        "articles_count": 0,
-                        "error": None
-                    }
+                return _decode_cached_sentiment(cached_result)
         except redis.exceptions.RedisError as e:
             logger.error(f"Redis GET error for key {cache_key}: {e}. Proceeding without cache.")
             # Не перевыбрасываем, чтобы продолжить без кэша
@@ -188,30 +367,13 @@ def sentiment_tool(ticker: str, window_days: int = 3) -> Dict[str, Any]:
     logger.info(f"Calculating sentiment for '{ticker}' (window: {window_days} days), no cache or cache expired.")
     news_articles = _fetch_news_from_api(ticker, window_days)
     
-    headlines = []
-    for article in news_articles:
-        title = article.get('title')
-        if title: # Убедимся, что заголовок есть
-            headlines.append(title)
-    
-    if not headlines:
-        logger.info(f"No relevant headlines found for '{ticker}' in the last {window_days} days.")
-        final_result = {
-            "score": 0.0,
-            "articles_count": 0,
-            "error": f"Не найдены новости для тикера {ticker} за последние {window_days} дней."
-        }
-    else:
-        final_score = _calculate_sentiment_score(headlines)
-        final_result = {
-            "score": final_score,
-            "articles_count": len(headlines),
-            "error": None
-        }
+    headlines = _headlines_from_articles(news_articles)
+    final_score = _calculate_sentiment_score(headlines) if headlines else 0.0
+    final_result = _sentiment_result(ticker, window_days, headlines, final_score)
 
     if redis_cli:
         try:
-            redis_cli.setex(cache_key, CACHE_TTL_SECONDS, json.dumps(final_result))
+            redis_cli.setex(cache_key, CACHE_TTL_SECONDS, msgpack.packb(final_result))
             logger.info(f"Cached sentiment for '{ticker}' (window: {window_days} days)")
         except redis.exceptions.RedisError as e:
             logger.error(f"Redis SETEX error for key {cache_key}: {e}.")
@@ -219,9 +381,92 @@ def sentiment_tool(ticker: str, window_days: int = 3) -> Dict[str, Any]:
 
     return final_result
 
+def sentiment_tool_batch(tickers: List[str], window_days: int = 3) -> Dict[str, Dict[str, Any]]:
+    """
+    Calculates sentiment scores for several tickers at once.
+
+    Cached results are fetched with a single Redis MGET, news for all uncached
+    tickers is fetched concurrently, their headlines are scored in one FinBERT
+    forward pass, and fresh results are written back with one pipelined burst
+    of SETEX commands.
+
+    Args:
+        tickers: The stock ticker symbols (e.g., ["AAPL", "MSFT"]).
+        window_days: The number of past days to fetch news for (default is 3).
+
+    Returns:
+        A dictionary {ticker: result}, where each result has the same format as sentiment_tool().
+    """
+    tickers = list(dict.fromkeys(tickers)) # Убираем дубликаты, сохраняя порядок
+    results: Dict[str, Dict[str, Any]] = {}
+
+    available = get_available_tickers()
+    pending = []
+    for ticker in tickers:
+        if ticker in available:
+            pending.append(ticker)
+        else:
+            logger.warning(f"Модель для тикера {ticker} не найдена в {MODELS_DIR}")
+            results[ticker] = {
+                "score": 0.0,
+                "articles_count": 0,
+                "error": f"Тикер {ticker} недоступен: модель не найдена"
+            }
+
+    if pending and not NEWSAPI_KEY:
+        logger.warning("NEWSAPI_KEY is not set. Sentiment tool cannot fetch news.")
+        for ticker in pending:
+            results[ticker] = {
+                "score": 0.0,
+                "articles_count": 0,
+                "error": "API ключ для новостей не настроен. Анализ настроений недоступен."
+            }
+        pending = []
+
+    if pending:
+        redis_cli = _get_redis_client()
+        cache_keys = [_cache_key(ticker, window_days) for ticker in pending]
+
+        missing = pending
+        if redis_cli:
+            try:
+                cached_results = redis_cli.mget(cache_keys) # Один round-trip на все тикеры
+                missing = []
+                for ticker, cached_result in zip(pending, cached_results):
+                    if cached_result is None:
+                        missing.append(ticker)
+                    else:
+                        results[ticker] = _decode_cached_sentiment(cached_result)
+                logger.info(f"Sentiment cache hits: {len(pending) - len(missing)}/{len(pending)} (window: {window_days} days)")
+            except redis.exceptions.RedisError as e:
+                logger.error(f"Redis MGET error for keys {cache_keys}: {e}. Proceeding without cache.")
+
+        if missing:
+            # Модель нужна только для промахов кэша: при полном попадании FinBERT не загружается
+            _get_tokenizer_model()
+            news_by_ticker = _fetch_news_for_tickers(missing, window_days)
+            headline_groups = [_headlines_from_articles(news_articles) for news_articles in news_by_ticker]
+            scores = _calculate_sentiment_scores(headline_groups)
+            for ticker, headlines, score in zip(missing, headline_groups, scores):
+                results[ticker] = _sentiment_result(ticker, window_days, headlines, score)
+
+            if redis_cli:
+                try:
+                    pipe = redis_cli.pipeline(transaction=False)
+                    for ticker in missing:
+                        pipe.setex(_cache_key(ticker, window_days), CACHE_TTL_SECONDS, msgpack.packb(results[ticker]))
+                    pipe.execute()
+                    logger.info(f"Cached sentiment for {missing} (window: {window_days} days)")
+                except redis.exceptions.RedisError as e:
+                    logger.error(f"Redis pipelined SETEX error for {missing}: {e}.")
+
+    return {ticker: results[ticker] for ticker in tickers}
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
-    if not NEWSAPI_KEY:
+    if "--export-torchscript" in sys.argv:
+        export_torchscript_model()
+    elif not NEWSAPI_KEY:
         print("Please set the NEWSAPI_KEY environment variable to run this example.")
         print("E.g., export NEWSAPI_KEY='your_actual_api_key'")
     else:
@@ -0,0 +1,25 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Инициализация --- #
+_yf_session = None
+
+
+def get_yf_session():
+    """
+    Возвращает общую HTTP-сессию для всех вызовов yfinance.
+
+    Одна сессия на процесс позволяет переиспользовать keep-alive соединения
+    с Yahoo Finance вместо нового TLS-рукопожатия на каждый запрос.
+    yfinance >= 0.2.55 принимает только сессии curl_cffi, поэтому используется она.
+    Если curl_cffi недоступен, возвращается None и yfinance создает сессию сам.
+    """
+    global _yf_session
+    if _yf_session is None:
+        try:
+            from curl_cffi import requests as curl_requests
+            _yf_session = curl_requests.Session(impersonate="chrome")
+        except ImportError:
+            logger.debug("curl_cffi not installed, yfinance will manage its own session.")
+    return _yf_session
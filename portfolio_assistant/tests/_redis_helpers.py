@@ -0,0 +1,23 @@
+"""Вспомогательные функции очистки Redis для тестовых фикстур."""
+from typing import List, Sequence
+
+
+def bulk_unlink(client, keys: Sequence, chunk: int = 128) -> None:
+    """
+    Удаляет ключи пачками по `chunk` через UNLINK.
+
+    Одна огромная variadic-команда блокирует однопоточный Redis, а DEL по одному
+    ключу умножает число RTT; пачки отправляются одним pipeline без MULTI.
+    """
+    if not keys:
+        return
+    pipe = client.pipeline(transaction=False)
+    for i in range(0, len(keys), chunk):
+        pipe.unlink(*keys[i:i + chunk])
+    pipe.execute()
+
+
+def unlink_matching(client, pattern: str, count: int = 500) -> None:
+    """Удаляет ключи по шаблону: SCAN (без блокирующего KEYS) + bulk_unlink."""
+    keys: List = list(client.scan_iter(match=pattern, count=count))
+    bulk_unlink(client, keys)
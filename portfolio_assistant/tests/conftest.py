@@ -0,0 +1,131 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+logger = logging.getLogger(__name__)
+
+TEST_TICKER = "TEST"
+TEST_MODEL_FILENAME = f"catboost_{TEST_TICKER}.cbm"
+# Тикеры, для которых во временном каталоге моделей сохраняется dummy-модель
+DUMMY_MODEL_TICKERS = (TEST_TICKER, "AAPL")
+# Redis для тестов (предполагаем, что Redis запущен локально)
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _configure_logging():
+    """Configures logging for tests once per session instead of in every test module."""
+    logging.basicConfig(level=logging.INFO)
+
+
+@pytest.fixture(scope="session")
+def create_dummy_catboost_model(tmp_path_factory):
+    """
+    Creates a dummy CatBoost model for testing the forecast_tool.
+    The model is trained once per session (per xdist worker) into a temporary
+    models directory, and forecast_tool.MODELS_DIR points there for the whole
+    session, so the real models/ directory is never touched.
+    """
+    # Импорт внутри фикстуры: остальные тестовые модули не должны зависеть
+    # от catboost/pandas_ta на этапе сбора тестов
+    from catboost import CatBoostRegressor
+    from src.tools import forecast_tool
+    from src.tools.forecast_tool import FEATURE_COLUMNS
+
+    models_dir = tmp_path_factory.mktemp("models")
+    test_model_path = models_dir / TEST_MODEL_FILENAME
+    logger.info(f"Creating dummy CatBoost model at {test_model_path}...")
+
+    # Детерминированные данные: модель не оценивается по качеству, важна только форма
+    rng = np.random.default_rng(0)
+    n_samples = 32
+    n_features = len(FEATURE_COLUMNS)
+    X_train = pd.DataFrame(rng.random((n_samples, n_features), dtype=np.float32), columns=FEATURE_COLUMNS)
+    y_train = pd.Series(rng.random(n_samples, dtype=np.float32))
+
+    # Initialize and train a simple CatBoostRegressor
+    # allow_writing_files=False: без каталога catboost_info/ на каждый запуск
+    model = CatBoostRegressor(
+        depth=2, iterations=5, verbose=0, thread_count=1, allow_writing_files=False
+    )
+    model.fit(X_train, y_train)
+
+    # Та же модель для остальных тикеров тестового снапшота: forecast_tool
+    # проверяет наличие модели до чтения снапшота
+    for ticker in DUMMY_MODEL_TICKERS:
+        model.save_model(str(models_dir / f"catboost_{ticker}.cbm"))
+    logger.info(f"Dummy models saved to {models_dir}")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(forecast_tool, "MODELS_DIR", models_dir)
+        yield test_model_path # Test session runs here
+
+
+@pytest.fixture(scope="session")
+def redis_pool():
+    """One Redis connection pool for the whole session (decode_responses=True, as SnapshotRegistry expects)."""
+    import redis
+
+    pool = redis.ConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True, max_connections=16
+    )
+    yield pool
+    pool.disconnect()
+
+
+@pytest.fixture(scope="session")
+def shared_registry(tmp_path_factory, redis_pool):
+    """
+    One SnapshotRegistry for the whole test session.
+    Tests save snapshots under unique ids and delete only their own keys,
+    so there is no per-test rmtree or Redis-wide cleanup.
+    """
+    from src.market_snapshot.registry import SnapshotRegistry
+
+    return SnapshotRegistry(
+        s3_stub_path=str(tmp_path_factory.mktemp("snap")), connection_pool=redis_pool
+    )
+
+
+@pytest.fixture(scope="session")
+def cached_ohlcv() -> pd.DataFrame:
+    """
+    Deterministic daily OHLCV frame (~3 years of business days) shaped like
+    yf.download output; used instead of network calls in forecast tests.
+    """
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range(end="2024-12-31", periods=780, name="Date")
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(index))))
+    open_ = close * (1.0 + rng.normal(0.0, 0.003, len(index)))
+    high = np.maximum(open_, close) * (1.0 + rng.uniform(0.0, 0.01, len(index)))
+    low = np.minimum(open_, close) * (1.0 - rng.uniform(0.0, 0.01, len(index)))
+    volume = rng.integers(1_000_000, 5_000_000, len(index)).astype(float)
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warmup():
+    """
+    Pays the heavy import and first-solve cost (catboost, PyPortfolioOpt/cvxpy)
+    once per session/xdist worker instead of inside the first test.
+    """
+    try:
+        import catboost  # noqa: F401
+        from pypfopt import EfficientFrontier
+    except ImportError as e:
+        logger.info(f"Warm-up skipped: {e}")
+        return
+
+    # Минимальная задача на 2 актива прогревает канонизацию cvxpy и загрузку солвера
+    mu = pd.Series({"A": 0.10, "B": 0.05})
+    sigma = pd.DataFrame([[0.04, 0.01], [0.01, 0.02]], index=mu.index, columns=mu.index)
+    try:
+        EfficientFrontier(mu, sigma).max_sharpe(risk_free_rate=0.0)
+    except Exception as e:
+        logger.info(f"Warm-up solve failed: {e}")
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from src.tools import available_models
+from src.tools.available_models import clear_ticker_cache, get_available_tickers
+
+
+@pytest.fixture(autouse=True)
+def _clean_ticker_cache():
+    """Each test starts and ends with an empty availability cache."""
+    clear_ticker_cache()
+    yield
+    clear_ticker_cache()
+
+
+def _set_mtime_ns(path, mtime_ns: int) -> None:
+    # Explicit mtime: filesystem timestamp granularity must not decide cache hits
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_missing_models_dir_returns_empty_set(tmp_path):
+    assert get_available_tickers(tmp_path / "missing") == frozenset()
+
+
+def test_cache_hit_until_mtime_changes(tmp_path):
+    (tmp_path / "catboost_AAA.cbm").touch()
+    (tmp_path / "notes.txt").touch()
+    _set_mtime_ns(tmp_path, 1_000_000_000)
+
+    first = get_available_tickers(tmp_path)
+    assert first == frozenset({"AAA"})
+    assert get_available_tickers(tmp_path) is first  # Повторный вызов берется из кеша
+
+    # Новый файл при неизменном mtime директории не виден: работает кеш
+    (tmp_path / "catboost_BBB.cbm").touch()
+    _set_mtime_ns(tmp_path, 1_000_000_000)
+    assert get_available_tickers(tmp_path) is first
+
+    # Изменение mtime приводит к повторному сканированию
+    _set_mtime_ns(tmp_path, 2_000_000_000)
+    assert get_available_tickers(tmp_path) == frozenset({"AAA", "BBB"})
+
+    (tmp_path / "catboost_AAA.cbm").unlink()
+    _set_mtime_ns(tmp_path, 3_000_000_000)
+    assert get_available_tickers(tmp_path) == frozenset({"BBB"})
+
+
+def test_clear_ticker_cache_forces_rescan(tmp_path):
+    (tmp_path / "catboost_AAA.cbm").touch()
+    _set_mtime_ns(tmp_path, 1_000_000_000)
+    assert get_available_tickers(tmp_path) == frozenset({"AAA"})
+
+    (tmp_path / "catboost_BBB.cbm").touch()
+    _set_mtime_ns(tmp_path, 1_000_000_000)
+    clear_ticker_cache()
+    assert tmp_path not in available_models._available_cache
+    assert get_available_tickers(tmp_path) == frozenset({"AAA", "BBB"})
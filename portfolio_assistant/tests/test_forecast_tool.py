@@ -1,174 +1,82 @@
 import pytest
 import pandas as pd
-import numpy as np
-from pathlib import Path
-import shutil # For cleaning up model files
 import logging
+import pickle
 from datetime import datetime, timezone
+from uuid import uuid4
 
-from catboost import CatBoostRegressor
-
-from src.tools.forecast_tool import forecast_tool, MODELS_DIR, FEATURE_COLUMNS
+from src.tools.forecast_tool import forecast_tool
 from src.market_snapshot.registry import SnapshotRegistry
 from src.market_snapshot.model import MarketSnapshot, SnapshotMeta
 
-# Configure logging for tests
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
+# Dummy-модель catboost_TEST.cbm создается session-фикстурой в conftest.py
 TEST_TICKER = "TEST"
-TEST_MODEL_FILENAME = f"catboost_{TEST_TICKER}.cbm"
-TEST_MODEL_PATH = MODELS_DIR / TEST_MODEL_FILENAME
-
-# Ensure MODELS_DIR exists
-MODELS_DIR.mkdir(parents=True, exist_ok=True)
-
-@pytest.fixture(scope="module", autouse=True)
-def create_dummy_catboost_model():
-    """
-    Creates and saves a dummy CatBoost model for testing the forecast_tool.
-    This fixture runs once per module.
-    """
-    logger.info(f"Creating dummy CatBoost model at {TEST_MODEL_PATH}...")
-    # Generate some random data
-    n_samples = 100
-    n_features = len(FEATURE_COLUMNS)
-    X_train = pd.DataFrame(np.random.rand(n_samples, n_features), columns=FEATURE_COLUMNS)
-    y_train = pd.Series(np.random.rand(n_samples))
-
-    # Initialize and train a simple CatBoostRegressor
-    model = CatBoostRegressor(depth=2, iterations=10, verbose=0) # Simple model
-    model.fit(X_train, y_train)
-
-    # Save the model
-    model.save_model(str(TEST_MODEL_PATH))
-    logger.info(f"Dummy model saved to {TEST_MODEL_PATH}")
-
-    yield # Test runs here
-
-    # Teardown: Clean up the dummy model file after all tests in the module are done
-    logger.info(f"Cleaning up dummy model {TEST_MODEL_PATH}...")
-    if TEST_MODEL_PATH.exists():
-        TEST_MODEL_PATH.unlink()
-    # Clean up MODELS_DIR if it became empty and was created by this test
-    # More robust cleanup might be needed if other tests use MODELS_DIR
-    try:
-        if not any(MODELS_DIR.iterdir()): # Check if directory is empty
-            MODELS_DIR.rmdir()
-            logger.info(f"Cleaned up empty models directory: {MODELS_DIR}")
-    except OSError as e:
-        logger.warning(f"Could not remove models directory {MODELS_DIR}: {e}")
-
 
-
-@pytest.fixture(scope="function")
-def registry_with_test_snapshot() -> SnapshotRegistry:
-    """Provides a registry and ensures a test snapshot is saved and cleaned up."""
-    # Using the registry fixture from conftest.py or a shared location if available
-    # For now, assuming registry_fixture is the one defined in test_snapshot.py if run together,
-    # or we can instantiate one directly.
-    # Let's make this fixture self-contained for SnapshotRegistry for clarity
-    # This will re-use the same TEST_S3_STUB_PATH as in test_snapshot.py if tests run together
-    # and that fixture clears it. If run separately, it will create its own clean stub.
-
-    # This fixture will create its own registry to avoid interference if test_snapshot tests are not run.
-    # It also needs to manage its own Redis and S3 stub state specific to this test.
-    # NOTE: For a real setup, `registry_fixture` would come from a conftest.py
-
-    # This duplicates some setup, ideally this would be a shared fixture
-    # from tests.test_snapshot import TEST_S3_STUB_PATH as SNAPSHOT_TEST_S3_STUB_PATH
-    SNAPSHOT_TEST_S3_STUB_PATH = "local_test/snapshots_forecast_tool" # Define locally
-
-    if Path(SNAPSHOT_TEST_S3_STUB_PATH).exists():
-        shutil.rmtree(SNAPSHOT_TEST_S3_STUB_PATH)
-    Path(SNAPSHOT_TEST_S3_STUB_PATH).mkdir(parents=True, exist_ok=True)
-
-    registry = SnapshotRegistry(s3_stub_path=SNAPSHOT_TEST_S3_STUB_PATH)
-    registry.delete_all_snapshots_dangerously() # Clear for this test run
-
-    # Create and save a specific snapshot for testing the forecast_tool's snapshot branch
-    meta = SnapshotMeta(
-        id="forecast_test_snap_001",
+# Snapshot for testing the forecast_tool's snapshot branch: validated once,
+# each test gets a pickled copy with its own id
+_SNAPSHOT_TEMPLATE_BYTES = pickle.dumps(MarketSnapshot(
+    meta=SnapshotMeta(
+        id="",
         created_at=datetime.now(timezone.utc),
         horizon_days=30,
         asset_universe=[TEST_TICKER, "AAPL"]
-    )
-    snapshot_data = MarketSnapshot(
-        meta=meta,
-        mu={TEST_TICKER: 0.055, "AAPL": 0.022},
-        sigma={ # Covariance matrix entries
-            TEST_TICKER: {TEST_TICKER: 0.012, "AAPL": 0.005},
-            "AAPL": {TEST_TICKER: 0.005, "AAPL": 0.008}
-        },
-        sentiment={TEST_TICKER: 0.6, "AAPL": 0.3},
-        raw_features_path="/path/to/dummy_features.csv"
-    )
+    ),
+    mu={TEST_TICKER: 0.055, "AAPL": 0.022},
+    sigma={ # Covariance matrix entries
+        TEST_TICKER: {TEST_TICKER: 0.012, "AAPL": 0.005},
+        "AAPL": {TEST_TICKER: 0.005, "AAPL": 0.008}
+    },
+    sentiment={TEST_TICKER: 0.6, "AAPL": 0.3},
+    raw_features_path="/path/to/dummy_features.csv"
+))
+
+# Все тесты модуля используют session-фикстуру с dummy-моделью из conftest.py
+pytestmark = pytest.mark.usefixtures("create_dummy_catboost_model")
+
+@pytest.fixture(scope="function")
+def forecast_snapshot_id(shared_registry: SnapshotRegistry) -> str:
+    """Saves a test snapshot under a unique id and removes only that key afterwards."""
+    registry = shared_registry
+
+    # Копия шаблона без повторной pydantic-валидации; меняется только id
+    snapshot_data = pickle.loads(_SNAPSHOT_TEMPLATE_BYTES)
+    snapshot_id = f"fc_{uuid4().hex}"
+    snapshot_data.meta.id = snapshot_id
+    snapshot_data.meta.snapshot_id = snapshot_id
     saved_id = registry.save(snapshot_data)
     logger.info(f"Saved snapshot {saved_id} for forecast_tool test.")
 
-    yield registry # Provide the configured registry to the test
+    yield saved_id # Provide the snapshot id to the test
 
-    # Teardown for this specific fixture
-    registry.delete_all_snapshots_dangerously() # Clean up what this fixture created
-    if Path(SNAPSHOT_TEST_S3_STUB_PATH).exists():
-        shutil.rmtree(SNAPSHOT_TEST_S3_STUB_PATH)
+    # Teardown: удаляем только ключ этого теста
+    registry.redis_client.delete(f"{registry._snapshot_key_prefix}{saved_id}")
 
 
-def test_forecast_tool_on_demand(create_dummy_catboost_model):
+def test_forecast_tool_on_demand(monkeypatch, cached_ohlcv: pd.DataFrame):
     """
     Tests the on-demand forecasting capability of forecast_tool using the dummy model.
-    It checks if mu is a float. Sigma might be None if yfinance fails or data is too short.
+    yf.download is replaced with a cached OHLCV frame, so mu and sigma must be floats.
     """
     logger.info(f"Running test_forecast_tool_on_demand for ticker: {TEST_TICKER}")
-    # We need yfinance to be able to download data for some ticker.
-    # For the dummy model, the features are random, but yfinance needs a valid ticker to get OHLCV.
-    # Using "MSFT" as a generally available ticker for data download for the test.
-    # The `forecast_tool` will use `catboost_TEST.cbm` because `ticker=TEST_TICKER`.
-    # To make yfinance download work for `_calculate_features` and risk estimation,
-    # `forecast_tool` internally would use `ticker_yf` for yf.download().
-    # For this test, we rely on yfinance being able to get *some* data for the TEST_TICKER
-    # or we mock yf.download. For now, assume TEST_TICKER is something yf can query (e.g. if it was MSFT)
-    # Let's use a common, real ticker name for the data fetching part if TEST_TICKER is abstract
-    # However, forecast_tool loads `catboost_{ticker}.cbm`. So ticker must be TEST_TICKER.
-
-    # If TEST_TICKER itself isn't a valid yfinance ticker, this test will have issues
-    # with data download. For a robust test, one might mock yf.download or use a known valid ticker.
-    # For now, assuming yfinance can fetch data for a ticker named "TEST" or it will gracefully error out.
-    # A better approach: use a real ticker for which data can be fetched, and name the dummy model accordingly.
-    # E.g., TEST_TICKER = "MSFT" and model is models/catboost_MSFT.cbm (dummy)
-    # For this specific setup, we are using TEST_TICKER="TEST" and expecting `forecast_tool` to handle it.
+    # Патчим место импорта внутри forecast_tool: без сетевых вызовов и нестабильности
+    monkeypatch.setattr("src.tools.forecast_tool.yf.download", lambda *args, **kwargs: cached_ohlcv)
 
     result = forecast_tool(ticker=TEST_TICKER)
     logger.info(f"On-demand forecast result for {TEST_TICKER}: {result}")
 
     assert result is not None
-    assert "mu" in result
-    assert "sigma" in result
+    assert result.get("error") is None
     assert result["snapshot_id"] is None
+    assert isinstance(result["mu"], float)
+    assert isinstance(result["sigma"], float)
 
-    if result.get("error"): # If there was an error (e.g. yfinance download)
-        logger.warning(f"Forecast tool returned an error for {TEST_TICKER}: {result['error']}")
-        # In this case, mu and sigma might be None. This is acceptable if data download fails.
-        assert result["mu"] is None
-        assert result["sigma"] is None
-    else:
-        # If no error, mu should be a float. Sigma could still be None if risk calc fails.
-        assert isinstance(result["mu"], float)
-        if result["sigma"] is not None:
-            assert isinstance(result["sigma"], float)
-
-    # Try a known real ticker to ensure yfinance part works, if the dummy model was named e.g. catboost_MSFT.cbm
-    # For now, this part is commented as it depends on renaming the dummy model or having a real one.
-    # real_ticker_result = forecast_tool(ticker="MSFT") # Assuming a catboost_MSFT.cbm dummy model
-    # logger.info(f"On-demand forecast result for MSFT: {real_ticker_result}")
-    # assert isinstance(real_ticker_result["mu"], float)
-
-def test_forecast_tool_with_snapshot(registry_with_test_snapshot: SnapshotRegistry):
+def test_forecast_tool_with_snapshot(forecast_snapshot_id: str):
     """
     Tests the forecast_tool's ability to retrieve data from a snapshot.
     """
-    registry = registry_with_test_snapshot
-    snapshot_id_to_test = "forecast_test_snap_001"
+    snapshot_id_to_test = forecast_snapshot_id
 
     logger.info(f"Running test_forecast_tool_with_snapshot for ticker {TEST_TICKER} and snapshot {snapshot_id_to_test}")
     result = forecast_tool(ticker=TEST_TICKER, snapshot_id=snapshot_id_to_test)
@@ -198,22 +106,20 @@ def test_forecast_tool_with_snapshot(registry_with_test_snapshot: SnapshotRegist
     assert result_goog_snap["mu"] is None
 
 
-def test_forecast_tool_snapshot_not_found():
+def test_forecast_tool_snapshot_not_found(monkeypatch, cached_ohlcv: pd.DataFrame):
     """
     Tests behavior when a non-existent snapshot_id is provided.
     It should fall back to on-demand forecast.
     """
     logger.info(f"Running test_forecast_tool_snapshot_not_found for ticker: {TEST_TICKER}")
+    monkeypatch.setattr("src.tools.forecast_tool.yf.download", lambda *args, **kwargs: cached_ohlcv)
+
     result = forecast_tool(ticker=TEST_TICKER, snapshot_id="non_existent_snapshot_123")
     logger.info(f"Non-existent snapshot forecast result for {TEST_TICKER}: {result}")
 
     assert result is not None
     assert result["snapshot_id"] is None # Fell back from snapshot mode
-    # Check if mu is float (on-demand was attempted) or if there was an error (e.g. yf download)
-    if result.get("error"):
-        assert result["mu"] is None
-    else:
-        assert isinstance(result["mu"], float)
+    assert isinstance(result["mu"], float) # On-demand forecast was produced
 
 
 def test_forecast_tool_model_not_found():
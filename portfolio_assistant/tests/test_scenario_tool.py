@@ -1,64 +1,84 @@
 import pytest
 import uuid
-import copy
-import os
-import shutil
 import json
+import re
+import logging
 from datetime import datetime, timezone
 from typing import Dict, List, Any
 
-from src.tools.scenario_tool import scenario_adjust_tool, TickerAdjustment
+from _redis_helpers import bulk_unlink, unlink_matching
+import src.tools.scenario_tool as scenario_tool_module
+from src.tools.scenario_tool import (
+    _internal_scenario_adjust_tool_logic,
+    scenario_adjust_tool,
+    TickerAdjustment,
+)
 from src.market_snapshot.snapshot_registry import SnapshotRegistry
 from src.market_snapshot.snapshot import MarketSnapshot, SnapshotMeta
 
-# Константа для пути к тестовому S3 стабу для этого модуля тестов
-TEST_S3_STUB_PATH_SCENARIO = "local_test/snapshots_scenario_tool"
-# Конфигурация Redis (предполагаем, что Redis запущен локально для тестов)
-REDIS_HOST = "localhost"
-REDIS_PORT = 6379
-
-@pytest.fixture(scope="function")
-def registry_and_cleanup_scenario():
+# Базовый снэпшот сохраняется один раз на сессию и не удаляется между тестами.
+# Уникальный ID на процесс: каждый xdist-воркер импортирует модуль сам и не
+# пересекается с другими воркерами и с данными разработчика в том же Redis
+BASE_SNAPSHOT_ID = f"test_base_snap_for_scenario_{uuid.uuid4().hex}"
+_BASE_SNAPSHOT_KEY = f"snapshot:{BASE_SNAPSHOT_ID}"
+# ID сценариев строятся от корня цепочки ("<base_id>-scn-<hash>"), поэтому все они попадают под этот шаблон
+_SCENARIO_KEYS_PATTERN = f"snapshot:{BASE_SNAPSHOT_ID}-scn-*"
+
+# Суффикс ID сценария: ровно 8 шестнадцатеричных символов
+_HEX8 = re.compile(r"[0-9a-f]{8}")
+
+# JSON-строки корректировок сериализуются один раз при импорте модуля
+_DELTAS_AAPL_MSFT_JSON = json.dumps([{"ticker": "AAPL", "delta": 0.005}, {"ticker": "MSFT", "delta": -0.002}])
+_DELTAS_NEWCO_AAPL_JSON = json.dumps([{"ticker": "NEWCO", "delta": 0.05}, {"ticker": "AAPL", "delta": 0.001}])
+_DELTAS_AAPL_GOOG_JSON = json.dumps([{"ticker": "AAPL", "delta": 0.123}, {"ticker": "GOOG", "delta": -0.05}])
+_DELTAS_AAPL_SMALL_JSON = json.dumps([{"ticker": "AAPL", "delta": 0.01}])
+_DELTAS_AAPL_TINY_JSON = json.dumps([{"ticker": "AAPL", "delta": 0.001}])
+_DELTAS_EMPTY_JSON = "[]"
+_DELTAS_INVALID_JSON_NOT_LIST = json.dumps({"ticker": "AAPL", "delta": 0.1})
+_DELTAS_INVALID_JSON_ITEM_NOT_DICT = json.dumps([{"ticker": "AAPL", "delta": 0.1}, "not_a_dict"])
+_DELTAS_INVALID_JSON_MISSING_TICKER = json.dumps([{"delta": 0.1}])
+_DELTAS_INVALID_JSON_WRONG_DELTA = json.dumps([{"ticker": "AAPL", "delta": "not-a-float"}])
+
+@pytest.fixture(scope="session")
+def registry_and_cleanup_scenario(redis_pool, tmp_path_factory):
     """
-    Фикстура для создания и очистки SnapshotRegistry и S3 стаба для тестов scenario_tool.
-    Также очищает Redis от ключей, созданных в этих тестах.
+    Фикстура для создания SnapshotRegistry и S3 стаба один раз на сессию.
+    Удаляются только ключи этого модуля: базовый снэпшот и сценарии от него,
+    чужие снэпшоты в том же Redis (другие воркеры, данные разработчика) не трогаются.
     """
-    # Создаем директорию для S3 стаба, если ее нет
-    if not os.path.exists(TEST_S3_STUB_PATH_SCENARIO):
-        os.makedirs(TEST_S3_STUB_PATH_SCENARIO)
+    # S3 стаб во временном каталоге сессии: pytest создает и удаляет его сам
+    s3_stub_path = tmp_path_factory.mktemp("snapshots_scenario_tool", numbered=False)
 
     registry = SnapshotRegistry(
-        redis_host=REDIS_HOST,
-        redis_port=REDIS_PORT,
-        s3_stub_path=TEST_S3_STUB_PATH_SCENARIO
+        s3_stub_path=str(s3_stub_path),
+        connection_pool=redis_pool # Общий пул соединений из conftest.py
     )
-    # Очистка Redis перед тестом (только ключи, которые могут быть созданы этим тестом)
-    # Это более безопасно, чем flushall, если Redis используется другими тестами/приложениями
-    # В данном случае, SnapshotRegistry использует префикс "snapshot:"
-    # Сценарии будут иметь ID типа "base_id-scn-xxxx"
-    if registry.redis_client:
-        keys_to_delete = registry.redis_client.keys("snapshot:*") # Захватываем все снэпшоты
-        if keys_to_delete:
-            registry.redis_client.delete(*keys_to_delete)
 
-    yield registry
+    # Инструмент берет реестр из своего синглтона: подменяем его на тестовый,
+    # иначе сценарии пишутся в S3 стаб по умолчанию (local/snapshots) в рабочем каталоге
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(scenario_tool_module, "_snapshot_registry", registry)
+        yield registry
 
-    # Очистка после теста
+    # Очистка после сессии, включая базовый снэпшот
     if registry.redis_client:
-        keys_to_delete = registry.redis_client.keys("snapshot:*")
-        if keys_to_delete:
-            registry.redis_client.delete(*keys_to_delete)
+        unlink_matching(registry.redis_client, _SCENARIO_KEYS_PATTERN)
+        bulk_unlink(registry.redis_client, [_BASE_SNAPSHOT_KEY])
 
-    # Удаляем директорию S3 стаба
-    if os.path.exists(TEST_S3_STUB_PATH_SCENARIO):
-        shutil.rmtree(TEST_S3_STUB_PATH_SCENARIO)
+@pytest.fixture(autouse=True)
+def _clean_snapshots(registry_and_cleanup_scenario: SnapshotRegistry):
+    """Удаляет сценарные снэпшоты этого модуля после каждого теста (базовый снэпшот сохраняется)."""
+    yield
+    registry = registry_and_cleanup_scenario
+    if registry.redis_client:
+        unlink_matching(registry.redis_client, _SCENARIO_KEYS_PATTERN)
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def base_snapshot_data() -> Dict:
     """Данные для создания базового MarketSnapshot."""
     return {
         "meta": {
-            "id": "test_base_snap_for_scenario",
+            "id": BASE_SNAPSHOT_ID,
             "created_at": datetime.now(timezone.utc),
             "asset_universe": ["AAPL", "MSFT", "GOOG"],
             "horizon_days": 30,
@@ -76,9 +96,9 @@ def base_snapshot_data() -> Dict:
         "prices": {"AAPL": 150.0, "MSFT": 300.0, "GOOG": 2500.0}
     }
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def saved_base_snapshot(registry_and_cleanup_scenario: SnapshotRegistry, base_snapshot_data: Dict) -> MarketSnapshot:
-    """Создает, сохраняет и возвращает базовый MarketSnapshot."""
+    """Создает и сохраняет базовый MarketSnapshot один раз на сессию (тесты его только читают)."""
     registry = registry_and_cleanup_scenario
     meta_data = base_snapshot_data["meta"]
 
@@ -104,14 +124,10 @@ def test_successful_adjustment_and_save(registry_and_cleanup_scenario: SnapshotR
     registry = registry_and_cleanup_scenario
     original_id = saved_base_snapshot.meta.snapshot_id
 
-    adjustments_data = [
-        {"ticker": "AAPL", "delta": 0.005},
-        {"ticker": "MSFT", "delta": -0.002}
-    ]
-    deltas_json_str = json.dumps(adjustments_data)
+    deltas_json_str = _DELTAS_AAPL_MSFT_JSON
     expected_deltas_dict = {"AAPL": 0.005, "MSFT": -0.002}
 
-    new_snapshot_id = scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=deltas_json_str)
+    new_snapshot_id = _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=deltas_json_str)
 
     expected_prefix = original_id + "-scn-"
     assert new_snapshot_id.startswith(expected_prefix)
@@ -138,20 +154,19 @@ def test_successful_adjustment_and_save(registry_and_cleanup_scenario: SnapshotR
     original_reloaded: MarketSnapshot = registry.load(original_id)
     assert original_reloaded.mu == saved_base_snapshot.mu
 
-def test_adjust_ticker_not_in_snapshot(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot, capsys):
+def test_adjust_ticker_not_in_snapshot(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot, caplog):
     registry = registry_and_cleanup_scenario
     original_id = saved_base_snapshot.meta.snapshot_id
-    adjustments_data = [
-        {"ticker": "NEWCO", "delta": 0.05},
-        {"ticker": "AAPL", "delta": 0.001}
-    ]
-    deltas_json_str = json.dumps(adjustments_data)
+    deltas_json_str = _DELTAS_NEWCO_AAPL_JSON
     expected_AAPL_delta = 0.001
 
-    new_snapshot_id = scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=deltas_json_str)
+    with caplog.at_level(logging.WARNING, logger="src.tools.scenario_tool"):
+        new_snapshot_id = _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=deltas_json_str)
 
-    captured = capsys.readouterr()
-    assert "Warning: Ticker 'NEWCO' in deltas not found in original snapshot's mu. Adjustment for this ticker will be skipped." in captured.out
+    assert any(
+        record.levelno == logging.WARNING and "Ticker 'NEWCO'" in record.getMessage()
+        for record in caplog.records
+    )
 
     scenario_snap: MarketSnapshot = registry.load(new_snapshot_id)
     assert scenario_snap is not None
@@ -160,27 +175,54 @@ def test_adjust_ticker_not_in_snapshot(registry_and_cleanup_scenario: SnapshotRe
 
 def test_base_snapshot_not_found(registry_and_cleanup_scenario: SnapshotRegistry):
     non_existent_id = "id_that_does_not_exist"
-    deltas_json_str = json.dumps([{"ticker": "AAPL", "delta": 0.01}])
+    deltas_json_str = _DELTAS_AAPL_SMALL_JSON
     with pytest.raises(ValueError, match=f"Snapshot with ID '{non_existent_id}' not found."):
-        scenario_adjust_tool(snapshot_id=non_existent_id, deltas_json_string=deltas_json_str)
+        _internal_scenario_adjust_tool_logic(snapshot_id=non_existent_id, deltas_json_string=deltas_json_str)
 
 def test_empty_deltas_list_in_json_string(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     registry = registry_and_cleanup_scenario
     original_id = saved_base_snapshot.meta.snapshot_id
-    deltas_json_str = json.dumps([]) # Пустой список как JSON-строка
+    deltas_json_str = _DELTAS_EMPTY_JSON # Пустой список как JSON-строка
 
-    new_snapshot_id = scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=deltas_json_str)
-    expected_prefix = original_id + "-scn-"
-    assert new_snapshot_id.startswith(expected_prefix)
+    new_snapshot_id = _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=deltas_json_str)
+    # Без корректировок новый снапшот не создается, возвращается исходный ID
+    assert new_snapshot_id == original_id
 
     scenario_snap: MarketSnapshot = registry.load(new_snapshot_id)
     assert scenario_snap is not None
     assert scenario_snap.mu == saved_base_snapshot.mu
 
+def test_public_tool_empty_adjustments_returns_base_id(saved_base_snapshot: MarketSnapshot):
+    original_id = saved_base_snapshot.meta.snapshot_id
+
+    result = scenario_adjust_tool(tickers=[], adjustments={}, base_snapshot_id=original_id)
+
+    assert result["error"] is None
+    assert result["snapshot_id"] == original_id
+    assert result["base_snapshot_id"] == original_id
+
+def test_scenario_of_scenario_keeps_root_id(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
+    registry = registry_and_cleanup_scenario
+    root_id = saved_base_snapshot.meta.snapshot_id
+
+    first_id = _internal_scenario_adjust_tool_logic(snapshot_id=root_id, deltas_json_string=_DELTAS_AAPL_SMALL_JSON)
+    second_id = _internal_scenario_adjust_tool_logic(snapshot_id=first_id, deltas_json_string=_DELTAS_AAPL_TINY_JSON)
+
+    # ID сценария от сценария строится от корня цепочки, а не от ID родителя
+    assert second_id.startswith(f"{root_id}-scn-")
+    assert _HEX8.fullmatch(second_id[len(f"{root_id}-scn-"):])
+    assert second_id != first_id
+
+    second_snap: MarketSnapshot = registry.load(second_id)
+    assert second_snap is not None
+    assert second_snap.meta.properties["root_snapshot_id"] == root_id
+    assert second_snap.meta.properties["base_snapshot_id"] == first_id
+    assert second_snap.mu["AAPL"] == pytest.approx(saved_base_snapshot.mu["AAPL"] + 0.01 + 0.001)
+
 def test_id_generation_and_suffix_format(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     original_id = saved_base_snapshot.meta.snapshot_id
-    deltas_json_str = json.dumps([{"ticker": "AAPL", "delta": 0.001}])
-    new_snapshot_id = scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=deltas_json_str)
+    deltas_json_str = _DELTAS_AAPL_TINY_JSON
+    new_snapshot_id = _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=deltas_json_str)
 
     parts = new_snapshot_id.split("-scn-")
     assert len(parts) == 2
@@ -188,18 +230,14 @@ def test_id_generation_and_suffix_format(registry_and_cleanup_scenario: Snapshot
     assert parts[0] == base_id_for_new
 
     hash_suffix = parts[1]
-    assert len(hash_suffix) == 8
-    assert all(c in "0123456789abcdef" for c in hash_suffix.lower())
+    assert _HEX8.fullmatch(hash_suffix.lower())
 
 def test_original_snapshot_unchanged_in_registry(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     registry = registry_and_cleanup_scenario
     original_id = saved_base_snapshot.meta.snapshot_id
-    mu_before_tool_call = copy.deepcopy(saved_base_snapshot.mu)
-    deltas_json_str = json.dumps([
-        {"ticker": "AAPL", "delta": 0.123},
-        {"ticker": "GOOG", "delta": -0.05}
-    ])
-    scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=deltas_json_str)
+    mu_before_tool_call = dict(saved_base_snapshot.mu) # Значения float неизменяемы, поверхностной копии достаточно
+    deltas_json_str = _DELTAS_AAPL_GOOG_JSON
+    _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=deltas_json_str)
     original_snapshot_reloaded: MarketSnapshot = registry.load(original_id)
 
     assert original_snapshot_reloaded is not None
@@ -211,33 +249,33 @@ def test_invalid_json_string(registry_and_cleanup_scenario: SnapshotRegistry, sa
     original_id = saved_base_snapshot.meta.snapshot_id
     invalid_json_str = "not a valid json string {{{{ "
     with pytest.raises(ValueError, match="Invalid JSON format for deltas_json_string"):
-        scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=invalid_json_str)
+        _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=invalid_json_str)
 
 def test_json_string_not_a_list(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     original_id = saved_base_snapshot.meta.snapshot_id
-    json_str_not_list = json.dumps({"ticker": "AAPL", "delta": 0.1}) # JSON-объект, а не массив
+    json_str_not_list = _DELTAS_INVALID_JSON_NOT_LIST # JSON-объект, а не массив
     with pytest.raises(TypeError, match="Parsed deltas_json_string must be a list"):
-        scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=json_str_not_list)
+        _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=json_str_not_list)
 
 def test_json_list_item_not_a_dict(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     original_id = saved_base_snapshot.meta.snapshot_id
-    json_str_item_not_dict = json.dumps([{"ticker": "AAPL", "delta": 0.1}, "not_a_dict"])
+    json_str_item_not_dict = _DELTAS_INVALID_JSON_ITEM_NOT_DICT
     with pytest.raises(TypeError, match="Each item in the parsed list must be a dictionary, item at index 1 is <class 'str'>"):
-        scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=json_str_item_not_dict)
+        _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=json_str_item_not_dict)
 
 def test_invalid_adjustment_item_in_json_missing_ticker(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     original_id = saved_base_snapshot.meta.snapshot_id
-    json_str_missing_ticker = json.dumps([{"delta": 0.1}])
+    json_str_missing_ticker = _DELTAS_INVALID_JSON_MISSING_TICKER
     with pytest.raises(ValueError) as exc_info:
-        scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=json_str_missing_ticker)
+        _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=json_str_missing_ticker)
     assert "Field required [type=missing" in str(exc_info.value)
     assert "ticker" in str(exc_info.value)
 
 def test_invalid_adjustment_item_in_json_wrong_delta_type(registry_and_cleanup_scenario: SnapshotRegistry, saved_base_snapshot: MarketSnapshot):
     original_id = saved_base_snapshot.meta.snapshot_id
-    json_str_wrong_delta = json.dumps([{"ticker": "AAPL", "delta": "not-a-float"}])
+    json_str_wrong_delta = _DELTAS_INVALID_JSON_WRONG_DELTA
     with pytest.raises(ValueError) as exc_info:
-        scenario_adjust_tool(snapshot_id=original_id, deltas_json_string=json_str_wrong_delta)
+        _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas_json_string=json_str_wrong_delta)
     assert "Input should be a valid number" in str(exc_info.value)
     assert "unable to parse string as a number" in str(exc_info.value)
 
@@ -257,7 +295,7 @@ def test_invalid_adjustment_item_in_json_wrong_delta_type(registry_and_cleanup_s
 #     # import time
 #     # time.sleep(0.01) # Небольшая задержка, чтобы время точно изменилось
 
-#     new_snapshot_id = scenario_adjust_tool(snapshot_id=original_id, deltas=deltas)
+#     new_snapshot_id = _internal_scenario_adjust_tool_logic(snapshot_id=original_id, deltas=deltas)
 #     scenario_snap: MarketSnapshot = registry.load(new_snapshot_id)
 
 #     assert scenario_snap is not None
@@ -1,10 +1,12 @@
+import asyncio
+import msgpack
 import pytest
 import torch
 from unittest.mock import patch, MagicMock
-import time # Для проверки TTL кэша
 import os
 
-from src.tools.sentiment_tool import sentiment_tool, _get_redis_client, CACHE_TTL_SECONDS, NEWSAPI_KEY
+from _redis_helpers import unlink_matching
+from src.tools.sentiment_tool import sentiment_tool, sentiment_tool_batch, _cache_key, _get_redis_client, CACHE_TTL_SECONDS, NEWSAPI_KEY
 # Импортируем сам модуль, чтобы иметь доступ к его глобальным переменным
 import src.tools.sentiment_tool as sentiment_tool_module
 
@@ -12,38 +14,52 @@ import src.tools.sentiment_tool as sentiment_tool_module
 # Это позволит нам манипулировать одним и тем же экземпляром Redis (если он глобальный в модуле)
 # или легко предсказывать ключи.
 
-@pytest.fixture(scope="function", autouse=True)
-def clear_sentiment_cache_and_prepare_env():
-    """Очищает кэш Redis перед каждым тестом и временно устанавливает NEWSAPI_KEY для тестов."""
+# Тикеры, которые тесты считают доступными (у них "есть" модель CatBoost)
+SENTIMENT_TEST_TICKERS = frozenset({
+    "GOODCO", "BADCO", "MIXEDCO", "NONESCO", "ERRCO", "MODELFAIL", "CACHEAAPL", "NOKEYCO",
+})
+
+@pytest.fixture(scope="session")
+def sentiment_test_env(tmp_path_factory):
+    """
+    Один раз на сессию устанавливает NEWSAPI_KEY (если не задан) и подключается к Redis.
+    Возвращает клиент Redis (или None, если Redis недоступен).
+    """
     # Установим фиктивный ключ API для NewsAPI на время тестов, если он не задан глобально
     # Это позволит инициализировать NewsApiClient без ошибок в тестах, даже если ключ не задан в окружении.
     # Однако, реальные запросы к NewsAPI будут мокаться.
-    original_newsapi_key = os.environ.get("NEWSAPI_KEY")
-    if not original_newsapi_key:
-        os.environ["NEWSAPI_KEY"] = "test_api_key_dummy"
-        # Сбросить клиент, чтобы он переинициализировался с новым ключом, если нужно
-        # Это зависит от того, как _get_newsapi_client() реализован (если он кэширует None)
-        # В текущей реализации sentiment_tool, _get_newsapi_client() пересоздастся.
+    with pytest.MonkeyPatch.context() as mp:
+        if not os.environ.get("NEWSAPI_KEY"):
+            mp.setenv("NEWSAPI_KEY", "test_api_key_dummy")
+        # Модуль читает ключ при импорте, поэтому подменяем и его глобальную переменную
+        mp.setattr(sentiment_tool_module, "NEWSAPI_KEY", os.environ["NEWSAPI_KEY"])
+        # Тестовые тикеры считаются доступными независимо от содержимого models/
+        mp.setattr(sentiment_tool_module, "get_available_tickers", lambda: SENTIMENT_TEST_TICKERS)
+        # Свое пространство ключей кэша на процесс: xdist-воркеры не удаляют ключи друг друга
+        mp.setattr(sentiment_tool_module, "CACHE_KEY_PREFIX", f"sentiment-test-{os.getpid()}")
+        # Локальный экспорт TorchScript (если он есть) не должен подменять моки HF-модели
+        mp.setattr(sentiment_tool_module, "TORCHSCRIPT_PATH", tmp_path_factory.mktemp("finbert") / "finbert.ts")
+
+        sentiment_tool_module._redis_client = None
+        redis_cli = _get_redis_client()
+        yield redis_cli
+    # Выход из контекста восстанавливает исходные значения NEWSAPI_KEY и подмененных атрибутов
 
+@pytest.fixture(scope="function", autouse=True)
+def clear_sentiment_cache_and_prepare_env(sentiment_test_env):
+    """Очищает кэш Redis и сбрасывает глобальные переменные модуля перед каждым тестом."""
     # Сбрасываем глобальные переменные модели и токенизатора перед каждым тестом
     sentiment_tool_module._tokenizer = None
     sentiment_tool_module._model = None
-    sentiment_tool_module._redis_client = None # Также сбросим Redis клиент для чистоты
     sentiment_tool_module._newsapi_client = None # И NewsAPI клиент
+    # Redis-клиент не пересоздается: используется подключение, открытое на сессию
+    sentiment_tool_module._redis_client = sentiment_test_env
 
-    redis_cli = _get_redis_client()
+    redis_cli = sentiment_test_env
     if redis_cli:
-        # Очищаем только ключи, относящиеся к sentiment_tool, чтобы не затронуть другие тесты
-        # Предполагаем, что все ключи sentiment начинаются с "sentiment:"
-        keys_to_delete = redis_cli.keys("sentiment:*")
-        if keys_to_delete:
-            redis_cli.delete(*keys_to_delete)
+        # Очищаем только ключи этого воркера, чтобы не затронуть другие тесты и параллельные процессы
+        unlink_matching(redis_cli, f"{sentiment_tool_module.CACHE_KEY_PREFIX}:*")
     yield
-    # Восстанавливаем исходное значение NEWSAPI_KEY
-    if original_newsapi_key:
-        os.environ["NEWSAPI_KEY"] = original_newsapi_key
-    elif "NEWSAPI_KEY" in os.environ: # Если мы его установили
-        del os.environ["NEWSAPI_KEY"]
 
 # --- Mock данные для NewsAPI --- #
 MOCK_NEWS_ARTICLES_POSITIVE = {
@@ -77,46 +93,56 @@ MOCK_NEWSAPI_ERROR = {
 
 # --- Mock для модели HuggingFace --- #
 # Модель FinBERT возвращает логиты для [positive, negative, neutral]
+# Логиты строятся один раз на модуль: (1, 3) для одного заголовка
+_LOGITS_POS = torch.tensor([[2.197, -0.693, -0.693]]) # [0.9, 0.05, 0.05]
+_LOGITS_NEG = torch.tensor([[-0.693, 2.197, -0.693]]) # [0.05, 0.9, 0.05]
+
 class MockHfModelOutput:
-    def __init__(self, logits_batch): # logits_batch это, например, [[2.197, -0.693, -0.693]]
-        # self.logits = torch.tensor([logits_batch]) # Старая версия, создавала (1,1,3)
-        self.logits = torch.tensor(logits_batch)   # Новая версия, ожидает батч, создаст (1,3)
+    def __init__(self, logits: torch.Tensor): # Готовый тензор логитов формы (batch, 3)
+        self.logits = logits
 
 class MockHfModel(MagicMock):
     pass # Просто наследуем MagicMock, __call__ будет вести себя стандартно для MagicMock
 
+@pytest.fixture(scope="session")
+def finbert_mocks():
+    """Моки токенизатора и модели FinBERT, общие для всей сессии; тесты задают только return_value."""
+    return MagicMock(), MockHfModel()
+
 @patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained')
 @patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained')
 @patch('src.tools.sentiment_tool._fetch_news_from_api')
-def test_sentiment_tool_positive(mock_fetch_news, mock_tokenizer_load, mock_model_load):
+def test_sentiment_tool_positive(mock_fetch_news, mock_tokenizer_load, mock_model_load, finbert_mocks):
     """Тест с позитивными новостями."""
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_POSITIVE['articles']
 
-    mock_model_instance = MockHfModel()
+    mock_tokenizer, mock_model_instance = finbert_mocks
     # Мокаем вызов модели, чтобы вернуть предопределенные логиты
     # Это самый сложный чась для мока без глубокого понимания входных данных токенизатора
     # Логиты для [0.9, 0.05, 0.05] (pos, neg, neu)
-    mock_model_instance.return_value = MockHfModelOutput([[2.197, -0.693, -0.693]])
+    mock_model_instance.return_value = MockHfModelOutput(_LOGITS_POS)
     mock_model_load.return_value = mock_model_instance
-    mock_tokenizer_load.return_value = MagicMock() # Простой мок для токенизатора
+    mock_tokenizer_load.return_value = mock_tokenizer # Простой мок для токенизатора
 
-    score = sentiment_tool(ticker="GOODCO", window_days=1)
-    assert score > 0.8 # Ожидаем высокий позитивный балл (0.9 - 0.05 = 0.85)
+    result = sentiment_tool(ticker="GOODCO", window_days=1)
+    assert result["error"] is None
+    assert result["score"] > 0.8 # Ожидаем высокий позитивный балл (0.9 - 0.05 = 0.85)
 
 @patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained')
 @patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained')
 @patch('src.tools.sentiment_tool._fetch_news_from_api')
-def test_sentiment_tool_negative(mock_fetch_news, mock_tokenizer_load, mock_model_load):
+def test_sentiment_tool_negative(mock_fetch_news, mock_tokenizer_load, mock_model_load, finbert_mocks):
     """Тест с негативными новостями."""
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_NEGATIVE['articles']
-    mock_model_instance = MockHfModel()
+    mock_tokenizer, mock_model_instance = finbert_mocks
     # Логиты для [0.05, 0.9, 0.05]
-    mock_model_instance.return_value = MockHfModelOutput([[-0.693, 2.197, -0.693]])
+    mock_model_instance.return_value = MockHfModelOutput(_LOGITS_NEG)
     mock_model_load.return_value = mock_model_instance
-    mock_tokenizer_load.return_value = MagicMock()
+    mock_tokenizer_load.return_value = mock_tokenizer
 
-    score = sentiment_tool(ticker="BADCO", window_days=1)
-    assert score < -0.8 # Ожидаем высокий негативный балл (0.05 - 0.9 = -0.85)
+    result = sentiment_tool(ticker="BADCO", window_days=1)
+    assert result["error"] is None
+    assert result["score"] < -0.8 # Ожидаем высокий негативный балл (0.05 - 0.9 = -0.85)
 
 @patch('src.tools.sentiment_tool._fetch_news_from_api')
 @patch('src.tools.sentiment_tool._calculate_sentiment_score') # Мокаем всю функцию расчета
@@ -125,15 +151,17 @@ def test_sentiment_tool_mixed_mocked_calc(mock_calc_score, mock_fetch_news):
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_MIXED['articles']
     # Предположим, первый заголовок дает +0.7, второй -0.7. Среднее будет 0.
     mock_calc_score.return_value = 0.0
-    score = sentiment_tool(ticker="MIXEDCO", window_days=1)
-    assert score == pytest.approx(0.0)
+    result = sentiment_tool(ticker="MIXEDCO", window_days=1)
+    assert result["score"] == pytest.approx(0.0)
+    assert result["articles_count"] == 2
 
 @patch('src.tools.sentiment_tool._fetch_news_from_api')
 def test_sentiment_tool_no_news(mock_fetch_news):
     """Тест при отсутствии новостей."""
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_EMPTY['articles']
-    score = sentiment_tool(ticker="NONESCO", window_days=1)
-    assert score == 0.0
+    result = sentiment_tool(ticker="NONESCO", window_days=1)
+    assert result["score"] == 0.0
+    assert result["articles_count"] == 0
 
 @patch('src.tools.sentiment_tool._get_newsapi_client') # Мок самого клиента NewsAPI
 def test_sentiment_tool_newsapi_error(mock_news_client_getter):
@@ -142,8 +170,8 @@ def test_sentiment_tool_newsapi_error(mock_news_client_getter):
     mock_api_instance.get_everything.return_value = MOCK_NEWSAPI_ERROR
     mock_news_client_getter.return_value = mock_api_instance
 
-    score = sentiment_tool(ticker="ERRCO", window_days=1)
-    assert score == 0.0
+    result = sentiment_tool(ticker="ERRCO", window_days=1)
+    assert result["score"] == 0.0
 
 @patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained', side_effect=Exception("Model load failed"))
 @patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained')
@@ -152,21 +180,24 @@ def test_sentiment_tool_model_load_error(mock_fetch_news, mock_tokenizer_load, m
     """Тест при ошибке загрузки модели."""
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_POSITIVE['articles']
     # mock_tokenizer_load не важен, т.к. загрузка модели упадет раньше
-    score = sentiment_tool(ticker="MODELFAIL", window_days=1)
-    assert score == 0.0 # Ожидаем 0.0, так как _calculate_sentiment_score вернет 0.0 при ошибке
+    result = sentiment_tool(ticker="MODELFAIL", window_days=1)
+    assert result["score"] == 0.0 # Ожидаем 0.0, так как _calculate_sentiment_score вернет 0.0 при ошибке
 
 @patch('src.tools.sentiment_tool._fetch_news_from_api')
 @patch('src.tools.sentiment_tool._calculate_sentiment_score', return_value=0.75) # Мокаем результат расчета
 def test_sentiment_caching(mock_calc_score, mock_fetch_news, clear_sentiment_cache_and_prepare_env):
     """Тест кэширования в Redis."""
+    redis_cli = _get_redis_client()
+    if redis_cli is None:
+        pytest.skip("Redis client not available, skipping caching test.")
     mock_fetch_news.return_value = MOCK_NEWS_ARTICLES_POSITIVE['articles']
 
     ticker = "CACHEAAPL"
     window = 2
 
     # 1. Первый вызов - должен вызвать API и модель (через моки)
-    score1 = sentiment_tool(ticker=ticker, window_days=window)
-    assert score1 == 0.75
+    result1 = sentiment_tool(ticker=ticker, window_days=window)
+    assert result1["score"] == 0.75
     mock_fetch_news.assert_called_once_with(ticker, window)
     mock_calc_score.assert_called_once_with([MOCK_NEWS_ARTICLES_POSITIVE['articles'][0]['title']])
 
@@ -175,50 +206,239 @@ def test_sentiment_caching(mock_calc_score, mock_fetch_news, clear_sentiment_cac
     mock_calc_score.reset_mock()
 
     # 2. Второй вызов - должен вернуть из кэша, API и модель не вызываются
-    score2 = sentiment_tool(ticker=ticker, window_days=window)
-    assert score2 == 0.75
+    result2 = sentiment_tool(ticker=ticker, window_days=window)
+    assert result2["score"] == 0.75
     mock_fetch_news.assert_not_called()
     mock_calc_score.assert_not_called()
 
-    # 3. Проверка TTL - ждем истечения срока кэша + немного запаса
-    if _get_redis_client(): # Выполняем, только если Redis доступен
-        time.sleep(2) # Временно уменьшаем для быстрой проверки
+    # 3. Истечение TTL - вместо ожидания явно удаляем ключ перед третьим вызовом
+    redis_cli.delete(_cache_key(ticker, window))
 
-        # Дополнительно явно удалим ключ перед третьим вызовом, чтобы симулировать истечение TTL
-        # Это более надежно для теста, чем просто ждать
-        redis_cli = _get_redis_client()
-        if redis_cli:
-            cache_key = f"sentiment:{ticker}:{window}"
-            redis_cli.delete(cache_key)
-            # print(f"DEBUG: Deleted key {cache_key} before 3rd call") # для отладки
-
-        score3 = sentiment_tool(ticker=ticker, window_days=window)
-        assert score3 == 0.75
-        mock_fetch_news.assert_called_once_with(ticker, window) # Снова вызвали API
-        mock_calc_score.assert_called_once_with([MOCK_NEWS_ARTICLES_POSITIVE['articles'][0]['title']]) # И расчет
-    else:
-        pytest.skip("Redis client not available, skipping TTL part of caching test.")
-
-@patch.dict(os.environ, {"NEWSAPI_KEY": ""}) # Убираем ключ API
-@patch('src.tools.sentiment_tool._get_newsapi_client') # Чтобы перехватить его инициализацию
-def test_sentiment_tool_no_newsapi_key(mock_get_newsapi_client):
+    result3 = sentiment_tool(ticker=ticker, window_days=window)
+    assert result3["score"] == 0.75
+    mock_fetch_news.assert_called_once_with(ticker, window) # Снова вызвали API
+    mock_calc_score.assert_called_once_with([MOCK_NEWS_ARTICLES_POSITIVE['articles'][0]['title']]) # И расчет
+
+@patch('src.tools.sentiment_tool.NEWSAPI_KEY', "") # Ключ читается при импорте модуля, поэтому патчим атрибут
+@patch('src.tools.sentiment_tool._fetch_news_from_api')
+def test_sentiment_tool_no_newsapi_key(mock_fetch_news):
     """Тест, когда NEWSAPI_KEY не установлен."""
-    # Сбрасываем глобальный _newsapi_client, чтобы он попытался переинициализироваться
-    # Это нужно, если предыдущие тесты его уже инициализировали
-    # Мок _get_newsapi_client, чтобы он вернул None, как если бы ключ не был установлен
-    mock_get_newsapi_client.return_value = None
-
-    score = sentiment_tool(ticker="NOKEYCO", window_days=1)
-    # В текущей реализации sentiment_tool() не падает, а логгирует warning и продолжает,
-    # _fetch_news_from_api вернет [], что приведет к счету 0.0
-    assert score == 0.0
-    # Проверим, что _fetch_news_from_api был вызван (он внутри себя проверит клиента)
-    # Для этого нужно мокнуть _fetch_news_from_api, но это конфликтует с целью теста
-    # Проще проверить, что NewsApiClient не был создан с реальным ключом, но это сложно
-    # Достаточно того, что счет 0.0 при отсутствующем _newsapi_client
+    result = sentiment_tool(ticker="NOKEYCO", window_days=1)
+    # sentiment_tool() не падает, а сразу возвращает нейтральный результат с ошибкой
+    assert result["score"] == 0.0
+    assert result["articles_count"] == 0
+    assert result["error"] is not None
+    mock_fetch_news.assert_not_called()
 
-# Дополнительный тест: Проверить, что redis недоступен (сложно без изменения глобальных переменных или DI)
-# Можно было бы мокнуть redis.Redis().ping() чтобы вызвать исключение
+# --- sentiment_tool_batch --- #
+def _cached_entry(score: float, articles_count: int = 1) -> dict:
+    return {"score": score, "articles_count": articles_count, "error": None}
+
+@patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained')
+@patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained')
+@patch('src.tools.sentiment_tool._fetch_news_for_tickers')
+def test_sentiment_tool_batch_all_cache_hits(mock_fetch_news, mock_tokenizer_load, mock_model_load, sentiment_test_env):
+    """Все тикеры есть в кэше: результаты берутся одним MGET, новости и FinBERT не загружаются."""
+    redis_cli = sentiment_test_env
+    if redis_cli is None:
+        pytest.skip("Redis client not available, skipping batch cache test.")
+    cached = {"GOODCO": _cached_entry(0.6, 3), "BADCO": _cached_entry(-0.4, 2)}
+    for ticker, entry in cached.items():
+        redis_cli.setex(_cache_key(ticker, 1), CACHE_TTL_SECONDS, msgpack.packb(entry))
+
+    results = sentiment_tool_batch(["GOODCO", "BADCO", "GOODCO"], window_days=1)
+
+    assert results == cached
+    assert list(results) == ["GOODCO", "BADCO"] # Дубликаты убраны, порядок сохранен
+    mock_fetch_news.assert_not_called()
+    mock_tokenizer_load.assert_not_called()
+    mock_model_load.assert_not_called()
+
+@patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained')
+@patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained')
+@patch('src.tools.sentiment_tool._fetch_news_for_tickers')
+def test_sentiment_tool_batch_hits_and_misses(mock_fetch_news, mock_tokenizer_load, mock_model_load, finbert_mocks, sentiment_test_env):
+    """Попадания берутся из кэша, промахи считаются моделью и записываются обратно через SETEX с TTL."""
+    redis_cli = sentiment_test_env
+    if redis_cli is None:
+        pytest.skip("Redis client not available, skipping batch cache test.")
+    cached_good = _cached_entry(0.6, 3)
+    redis_cli.setex(_cache_key("GOODCO", 1), CACHE_TTL_SECONDS, msgpack.packb(cached_good))
+
+    mock_fetch_news.return_value = [MOCK_NEWS_ARTICLES_NEGATIVE['articles']]
+    mock_tokenizer, mock_model_instance = finbert_mocks
+    mock_model_instance.return_value = MockHfModelOutput(_LOGITS_NEG)
+    mock_model_load.return_value = mock_model_instance
+    mock_tokenizer_load.return_value = mock_tokenizer
+
+    results = sentiment_tool_batch(["GOODCO", "BADCO"], window_days=1)
+
+    assert results["GOODCO"] == cached_good
+    assert results["BADCO"]["error"] is None
+    assert results["BADCO"]["articles_count"] == 1
+    assert results["BADCO"]["score"] < -0.8
+    mock_fetch_news.assert_called_once_with(["BADCO"], 1) # Новости запрашиваются только для промахов
+
+    # Промах записан в кэш с тем же результатом и TTL
+    assert msgpack.unpackb(redis_cli.get(_cache_key("BADCO", 1)), raw=False) == results["BADCO"]
+    assert 0 < redis_cli.ttl(_cache_key("BADCO", 1)) <= CACHE_TTL_SECONDS
+    # Попадание не перезаписывается
+    assert msgpack.unpackb(redis_cli.get(_cache_key("GOODCO", 1)), raw=False) == cached_good
+
+@patch('src.tools.sentiment_tool._fetch_news_for_tickers')
+def test_sentiment_tool_batch_unavailable_ticker(mock_fetch_news):
+    """Тикеры без модели получают ошибку и не доходят до кэша и NewsAPI."""
+    results = sentiment_tool_batch(["NOMODELCO"], window_days=1)
+
+    assert results["NOMODELCO"]["score"] == 0.0
+    assert results["NOMODELCO"]["articles_count"] == 0
+    assert "модель не найдена" in results["NOMODELCO"]["error"]
+    mock_fetch_news.assert_not_called()
+
+@patch('src.tools.sentiment_tool.NEWSAPI_KEY', "")
+@patch('src.tools.sentiment_tool._get_tokenizer_model')
+@patch('src.tools.sentiment_tool._fetch_news_for_tickers')
+def test_sentiment_tool_batch_no_newsapi_key(mock_fetch_news, mock_get_model):
+    """Без NEWSAPI_KEY доступные тикеры получают ошибку, а недоступные - свою ошибку про модель."""
+    results = sentiment_tool_batch(["GOODCO", "NOMODELCO"], window_days=1)
+
+    assert results["GOODCO"]["score"] == 0.0
+    assert "API ключ" in results["GOODCO"]["error"]
+    assert "модель не найдена" in results["NOMODELCO"]["error"]
+    mock_fetch_news.assert_not_called()
+    mock_get_model.assert_not_called()
+
+# --- Асинхронная загрузка новостей (aiohttp) --- #
+class _FakeResponse:
+    def __init__(self, status: int, payload=None, reason: str = "OK"):
+        self.status = status
+        self.reason = reason
+        self._payload = payload
+
+    async def json(self):
+        return self._payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class _FakeClientSession:
+    """Заменяет aiohttp.ClientSession: get() отдает заданный ответ или бросает заданное исключение."""
+    def __init__(self, response=None, error=None):
+        self._response = response
+        self._error = error
+        self.requests = []
+
+    def __call__(self, *args, **kwargs): # Вызов aiohttp.ClientSession(timeout=...)
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, url, params=None, headers=None):
+        self.requests.append((url, params, headers))
+        if self._error is not None:
+            raise self._error
+        return self._response
+
+def test_fetch_news_for_tickers_success():
+    """Успешный ответ NewsAPI: статьи возвращаются по каждому тикеру, ключ передается заголовком."""
+    session = _FakeClientSession(response=_FakeResponse(200, MOCK_NEWS_ARTICLES_POSITIVE))
+    with patch('src.tools.sentiment_tool.aiohttp.ClientSession', session):
+        news = sentiment_tool_module._fetch_news_for_tickers(["GOODCO", "BADCO"], 2)
+
+    assert news == [MOCK_NEWS_ARTICLES_POSITIVE['articles']] * 2
+    assert [params["q"] for _, params, _ in session.requests] == ["GOODCO", "BADCO"]
+    url, params, headers = session.requests[0]
+    assert url == sentiment_tool_module.NEWSAPI_EVERYTHING_URL
+    assert headers == {"X-Api-Key": sentiment_tool_module.NEWSAPI_KEY}
+    assert "apiKey" not in params
+
+def test_fetch_news_for_tickers_non_200():
+    """HTTP-ошибка NewsAPI дает пустой список статей вместо исключения."""
+    session = _FakeClientSession(response=_FakeResponse(500, reason="Internal Server Error"))
+    with patch('src.tools.sentiment_tool.aiohttp.ClientSession', session):
+        news = sentiment_tool_module._fetch_news_for_tickers(["ERRCO"], 1)
+
+    assert news == [[]]
+
+def test_fetch_news_for_tickers_timeout():
+    """Таймаут запроса дает пустой список статей для тикера."""
+    session = _FakeClientSession(error=asyncio.TimeoutError())
+    with patch('src.tools.sentiment_tool.aiohttp.ClientSession', session):
+        news = sentiment_tool_module._fetch_news_for_tickers(["SLOWCO"], 1)
+
+    assert news == [[]]
+
+def test_fetch_news_for_tickers_inside_running_loop():
+    """Внутри работающего цикла событий обертка выполняет загрузку в отдельном потоке."""
+    session = _FakeClientSession(response=_FakeResponse(200, MOCK_NEWS_ARTICLES_NEGATIVE))
+
+    async def call_from_loop():
+        return sentiment_tool_module._fetch_news_for_tickers(["BADCO"], 1)
+
+    with patch('src.tools.sentiment_tool.aiohttp.ClientSession', session):
+        news = asyncio.run(call_from_loop())
+
+    assert news == [MOCK_NEWS_ARTICLES_NEGATIVE['articles']]
 
 # Дополнительный тест: Проверить, что redis недоступен (сложно без изменения глобальных переменных или DI)
 # Можно было бы мокнуть redis.Redis().ping() чтобы вызвать исключение
+
+# --- TorchScript-экспорт FinBERT --- #
+_TINY_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "stock", "surges", "drops", "on", "good", "news"]
+
+@pytest.fixture
+def tiny_finbert(tmp_path):
+    """
+    Маленькая случайно инициализированная BERT-модель и fast-токенизатор вместо загрузки ProsusAI/finbert.
+    Возвращает токенизатор и фабрику модели: from_pretrained-kwargs попадают в конфиг, веса одинаковы при каждом вызове.
+    """
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(_TINY_VOCAB))
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file))
+
+    def build_model(*args, **kwargs):
+        config = BertConfig(
+            vocab_size=len(_TINY_VOCAB), hidden_size=32, num_hidden_layers=1,
+            num_attention_heads=2, intermediate_size=37, num_labels=3, **kwargs,
+        )
+        torch.manual_seed(0)
+        return BertForSequenceClassification(config).eval()
+
+    return tokenizer, build_model
+
+def test_export_torchscript_model_loads_and_matches_eager(tiny_finbert, tmp_path, monkeypatch):
+    """Экспорт в TorchScript подхватывается _get_tokenizer_model и дает те же логиты, что и eager-модель."""
+    tokenizer, build_model = tiny_finbert
+    ts_path = tmp_path / "finbert.ts"
+    monkeypatch.setattr(sentiment_tool_module, "DEVICE", "cpu")
+    monkeypatch.setattr(sentiment_tool_module, "TORCHSCRIPT_PATH", ts_path)
+
+    with patch('src.tools.sentiment_tool.AutoTokenizer.from_pretrained', return_value=tokenizer), \
+         patch('src.tools.sentiment_tool.AutoModelForSequenceClassification.from_pretrained', side_effect=build_model) as mock_model_load:
+        assert sentiment_tool_module.export_torchscript_model(ts_path) == ts_path
+        assert ts_path.exists()
+
+        mock_model_load.reset_mock()
+        loaded_tokenizer, scripted = sentiment_tool_module._get_tokenizer_model()
+
+    assert loaded_tokenizer is tokenizer
+    assert isinstance(scripted, torch.jit.ScriptModule)
+    mock_model_load.assert_not_called() # Python-модель не собирается, граф грузится из файла
+
+    # Eager-эталон: те же веса и та же int8-квантизация, что и в ветке без TorchScript
+    eager = sentiment_tool_module._quantize_model(build_model())
+    inputs = tokenizer(["stock surges on good news"], padding="max_length", truncation=True,
+                       max_length=sentiment_tool_module.MAX_HEADLINE_TOKENS, return_tensors="pt")
+    with torch.inference_mode():
+        expected = sentiment_tool_module._model_logits(eager, inputs)
+        actual = sentiment_tool_module._model_logits(scripted, inputs)
+    torch.testing.assert_close(actual, expected)